@@ -1,10 +1,23 @@
-import matplotlib.pyplot as plt
-import pandas as pd
-from wordcloud import WordCloud
-import jieba
 import os
-from matplotlib.font_manager import FontProperties
-import re
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import token_cache
+from chart_renderer import ChartRenderer, chart_dir, render_pie, render_trend, render_wordcloud
+from comment_store import WEIBO_TIMEZONE, parse_weibo_times, read_comments
+from config import CHART_CONFIG
+from font_finder import find_chinese_font
+
+# 趋势图的时间桶（秒数, 名称），从细到粗
+TREND_BUCKETS = [
+    (60, '分钟'),
+    (5 * 60, '5分钟'),
+    (15 * 60, '15分钟'),
+    (3600, '小时'),
+    (6 * 3600, '6小时'),
+    (86400, '天')
+]
+
 
 class ChartMaker:
     def __init__(self):
@@ -15,170 +28,229 @@ class ChartMaker:
             'negative': '#e74c3c'   # 红色
         }
         self.labels = {
+            -1: '未分类',  # API多次失败、未能判断的评论
             0: '积极',
             1: '中性',
             2: '消极' 
         }
-        # 使用系统自带的中文字体或尝试多个字体路径
+        # 使用配置指定或系统中找到的中文字体
         self.font = self._get_chinese_font()
+        # 图表在后台进程中绘制，界面线程不被阻塞
+        self.renderer = ChartRenderer()
+        # 词云的分词和词频索引在后台线程中准备，第一次统计大数据集时界面也不会卡住
+        self._preparer = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chart-data')
         
     def _get_chinese_font(self):
-        """获取可用的中文字体路径"""
-        try:
-            # Windows系统常见中文字体路径
-            font_paths = [
-                'C:/Windows/Fonts/simhei.ttf',  # 黑体
-                'C:/Windows/Fonts/SIMYOU.TTF',  # 幼圆
-                'C:/Windows/Fonts/simsun.ttc',  # 宋体
-                'C:/Windows/Fonts/msyh.ttc',    # 微软雅黑
-            ]
-            
-            # 返回第一个存在的字体路径
-            for path in font_paths:
-                if os.path.exists(path):
-                    return path
-                    
+        """获取可用的中文字体路径（查找结果在进程内和磁盘上缓存，见font_finder.py）"""
+        return find_chinese_font()
+
+    def _pie_data(self, analyzed_file):
+        """统计各情感的评论数，返回(数据, 标签, 颜色)，没有数据时返回None"""
+        # 只读取情感列；分析结果导出时已按评论去重，每条评论只统计一次
+        df_deduplicated = read_comments(analyzed_file, columns=['sentiment'])
+        counts = df_deduplicated['sentiment'].value_counts()
+
+        # 准备绘图数据
+        sentiment_data = []
+        sentiment_labels = []
+        sentiment_colors = []
+
+        # 按固定顺序添加数据
+        for sentiment in [0, 1, 2]:
+            count = int(counts.get(sentiment, 0))
+            if count > 0:  # 只添加有数据的类别
+                sentiment_data.append(count)
+                sentiment_labels.append(self.labels[sentiment])
+                color = self.colors['positive' if sentiment == 0 else 'neutral' if sentiment == 1 else 'negative']
+                sentiment_colors.append(color)
+
+        if not sentiment_data:
+            return None
+        return sentiment_data, sentiment_labels, sentiment_colors
+
+    def _wordcloud_data(self, analyzed_file, sentiment):
+        if not self.font:
             raise Exception("未找到可用的中文字体")
-            
-        except Exception as e:
-            print(f"加载中文字体失败: {str(e)}")
+        # 词频来自一次统计好的索引（已去掉URL和停用词），切换情感只需重新绘制
+        frequencies = token_cache.word_frequencies(analyzed_file, sentiment)
+        if not frequencies:
+            raise Exception("没有可用于生成词云的评论")
+        return frequencies
+
+    @staticmethod
+    def _wordcloud_name(sentiment):
+        return f'wordcloud{"_" + str(sentiment) if sentiment is not None else ""}'
+
+    def preview_pie_chart(self, analyzed_file, size_px):
+        """在后台进程中按控件大小绘制低分辨率饼图
+
+        Returns:
+            Future，结果为图片路径；没有数据时返回None
+        """
+        data = self._pie_data(analyzed_file)
+        if data is None:
             return None
-    
+        width, height = size_px
+        output_file = os.path.join(chart_dir(analyzed_file), f'sentiment_pie_{width}x{height}.png')
+        return self.renderer.submit(
+            render_pie, *data, output_file, CHART_CONFIG.get('preview_dpi', 100), self.font, size_px
+        )
+
+    def _draw_wordcloud(self, analyzed_file, sentiment, output_file, dpi, size_px=None):
+        """在后台线程中取得词频（首次需要分词并建立索引），再交给绘图进程，返回图片路径"""
+        frequencies = self._wordcloud_data(analyzed_file, sentiment)
+        return self.renderer.submit(
+            render_wordcloud, frequencies, self.font, output_file, dpi, size_px
+        ).result()
+
+    def preview_wordcloud(self, analyzed_file, size_px, sentiment=None):
+        """在后台按控件大小绘制词云预览，返回Future（结果为图片路径）"""
+        width, height = size_px
+        output_file = os.path.join(
+            chart_dir(analyzed_file), f'{self._wordcloud_name(sentiment)}_{width}x{height}.png'
+        )
+        return self._preparer.submit(
+            self._draw_wordcloud, analyzed_file, sentiment, output_file,
+            CHART_CONFIG.get('preview_dpi', 100), size_px
+        )
+
+    def export_pie_chart(self, analyzed_file, output_file=None):
+        """在后台进程中绘制300dpi的饼图，返回Future；没有数据时返回None"""
+        data = self._pie_data(analyzed_file)
+        if data is None:
+            return None
+        output_file = output_file or os.path.join(chart_dir(analyzed_file), 'sentiment_pie.png')
+        return self.renderer.submit(
+            render_pie, *data, output_file, CHART_CONFIG.get('export_dpi', 300), self.font
+        )
+
+    def export_wordcloud(self, analyzed_file, output_file=None, sentiment=None):
+        """在后台绘制300dpi的词云，返回Future"""
+        output_file = output_file or os.path.join(
+            chart_dir(analyzed_file), f'{self._wordcloud_name(sentiment)}.png'
+        )
+        return self._preparer.submit(
+            self._draw_wordcloud, analyzed_file, sentiment, output_file, CHART_CONFIG.get('export_dpi', 300)
+        )
+
+    @staticmethod
+    def _trend_bucket(span_seconds):
+        """时间跨度内桶数不超过trend_max_buckets的最细时间桶"""
+        max_buckets = CHART_CONFIG.get('trend_max_buckets', 200)
+        for seconds, name in TREND_BUCKETS:
+            if span_seconds // seconds + 1 <= max_buckets:
+                return seconds, name
+        return TREND_BUCKETS[-1]
+
+    def sentiment_trend(self, analyzed_file, bucket=None):
+        """按时间桶统计各情感的评论数
+
+        Args:
+            bucket: TREND_BUCKETS中的(秒数, 名称)，None表示按时间跨度自动选择
+
+        Returns:
+            (DataFrame, (秒数, 名称))：索引为各桶的起始时间（北京时间），列为情感值0/1/2，
+            没有评论的桶计为0；没有可解析的发布时间时返回None
+        """
+        df = read_comments(analyzed_file, columns=['created_at', 'sentiment'])
+        if 'created_at' not in df.columns or 'sentiment' not in df.columns:
+            return None
+        times = parse_weibo_times(df['created_at'])
+        valid = times.notna().to_numpy()
+        if not valid.any():
+            return None
+
+        # 转为北京时间的秒数，按本地的整点、零点分桶
+        seconds = times[valid].dt.tz_localize(None).to_numpy().astype('datetime64[s]').astype(np.int64)
+        sentiments = pd.to_numeric(df['sentiment'], errors='coerce').fillna(-1).to_numpy()[valid].astype(np.int64)
+        bucket = bucket or self._trend_bucket(int(seconds.max() - seconds.min()))
+        start = seconds.min() // bucket[0] * bucket[0]
+        slots = (seconds - start) // bucket[0]
+        size = int(slots.max()) + 1
+
+        # 每条评论落在(时间桶, 情感)的一个格子里，一次bincount得到全部计数；未分类的评论不计
+        known = (sentiments >= 0) & (sentiments <= 2)
+        counts = np.bincount(slots[known] * 3 + sentiments[known], minlength=size * 3).reshape(size, 3)
+        index = pd.to_datetime(start + np.arange(size) * bucket[0], unit='s').tz_localize(WEIBO_TIMEZONE)
+        return pd.DataFrame(counts, index=index, columns=[0, 1, 2]), bucket
+
+    def _trend_data(self, analyzed_file):
+        """趋势图的绘图参数(时间, 各情感计数, 标签, 颜色, 时间桶名称)，没有数据时返回None"""
+        trend = self.sentiment_trend(analyzed_file)
+        if trend is None:
+            return None
+        counts, (_, bucket_name) = trend
+        sentiments = [sentiment for sentiment in (0, 1, 2) if counts[sentiment].any()]
+        if not sentiments:
+            return None
+        colors = {0: self.colors['positive'], 1: self.colors['neutral'], 2: self.colors['negative']}
+        return (
+            counts.index.tz_localize(None).to_numpy(),
+            [counts[sentiment].to_numpy() for sentiment in sentiments],
+            [self.labels[sentiment] for sentiment in sentiments],
+            [colors[sentiment] for sentiment in sentiments],
+            bucket_name
+        )
+
+    def _draw_trend(self, analyzed_file, output_file, dpi, size_px=None, style=None):
+        """在后台线程中读取并统计评论时间，再交给绘图进程，返回图片路径；没有数据时返回None"""
+        data = self._trend_data(analyzed_file)
+        if data is None:
+            return None
+        return self.renderer.submit(
+            render_trend, *data, output_file, dpi, self.font, size_px,
+            style or CHART_CONFIG.get('trend_style', 'area')
+        ).result()
+
+    def preview_trend_chart(self, analyzed_file, size_px, style=None):
+        """按控件大小绘制情感趋势图，返回Future（没有数据时结果为None）"""
+        width, height = size_px
+        output_file = os.path.join(chart_dir(analyzed_file), f'sentiment_trend_{width}x{height}.png')
+        return self._preparer.submit(
+            self._draw_trend, analyzed_file, output_file,
+            CHART_CONFIG.get('preview_dpi', 100), size_px, style
+        )
+
+    def export_trend_chart(self, analyzed_file, output_file=None, style=None):
+        """绘制300dpi的情感趋势图，返回Future（没有数据时结果为None）"""
+        output_file = output_file or os.path.join(chart_dir(analyzed_file), 'sentiment_trend.png')
+        return self._preparer.submit(
+            self._draw_trend, analyzed_file, output_file, CHART_CONFIG.get('export_dpi', 300), None, style
+        )
+
     def create_pie_chart(self, analyzed_file):
-        """生成情感分布饼图"""
+        """生成情感分布饼图（300dpi，等待绘制完成）"""
         try:
-            # 设置中文字体
-            plt.rcParams['font.sans-serif'] = ['SimHei']
-            plt.rcParams['axes.unicode_minus'] = False
-            
-            # 读取数据
-            df = pd.read_csv(analyzed_file)
-            
-            # 按固定顺序统计情感，确保每条评论只被统计一次
-            df_deduplicated = df.drop_duplicates(subset=['comment_id', 'content'], keep='last')
-            
-            # 初始化所有情感类别的计数
-            sentiment_counts = {0: 0, 1: 0, 2: 0}
-            
-            # 统计每个类别的数量
-            for sentiment in sentiment_counts.keys():
-                count = len(df_deduplicated[df_deduplicated['sentiment'] == sentiment])
-                sentiment_counts[sentiment] = count
-            
-            # 准备绘图数据
-            sentiment_data = []
-            sentiment_labels = []
-            sentiment_colors = []
-            
-            # 按固定顺序添加数据
-            for sentiment in [0, 1, 2]:
-                if sentiment_counts[sentiment] > 0:  # 只添加有数据的类别
-                    sentiment_data.append(sentiment_counts[sentiment])
-                    sentiment_labels.append(self.labels[sentiment])
-                    color = self.colors['positive' if sentiment == 0 else 'neutral' if sentiment == 1 else 'negative']
-                    sentiment_colors.append(color)
-            
-            # 如果没有数据，返回None
-            if not sentiment_data:
-                return None
-            
-            # 创建一个图形对象，避免动画效果
-            plt.ioff()  # 关闭交互模式
-            fig, ax = plt.subplots(figsize=(8, 6))
-            
-            # 直接绘制完整的饼图（不使用动画）
-            wedges, texts, autotexts = ax.pie(
-                sentiment_data,
-                labels=sentiment_labels,
-                colors=sentiment_colors,
-                autopct='%1.1f%%',
-                shadow=False,
-                textprops={'fontsize': 12, 'weight': 'bold'},
-                startangle=90
-            )
-            
-            ax.set_title('评论情感分布', fontsize=14, weight='bold', pad=20)
-            
-            # 确保图表被完全渲染
-            fig.canvas.draw()
-            
-            # 保存图片
-            if not os.path.exists('charts'):
-                os.makedirs('charts')
-            output_file = 'charts/sentiment_pie.png'
-            plt.savefig(output_file, bbox_inches='tight', dpi=300, transparent=False)
-            plt.close(fig)
-            
-            return output_file
-            
+            future = self.export_pie_chart(analyzed_file)
+            return future.result() if future else None
+
         except Exception as e:
             print(f"生成饼图失败: {str(e)}")
             return None
-            
+
     def create_wordcloud(self, analyzed_file, sentiment=None):
-        """生成词云图"""
+        """生成词云图（300dpi，等待绘制完成）"""
         try:
-            # 获取字体路径
-            font_path = self._get_chinese_font()
-            if not font_path:
-                raise Exception("未找到可用的中文字体")
-            
-            # 读取分析结果
-            df = pd.read_csv(analyzed_file)
-            if sentiment is not None:
-                df = df[df['sentiment'] == sentiment]
-            
-            # 合并评论文本并过滤URL
-            text = ' '.join(df['content'].astype(str))
-            
-            # 过滤URL
-            text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-            
-            # 添加停用词
-            stop_words = set(['了', '的', '是', '啊', '吗', '呢', '吧', '呀', '着', '啦', '么', 
-                             '都', '就', '也', '要', '这', '那', '不', '还', '有', '和', '我',
-                             '你', '他', '她', '它', '们', '个', '年', '月', '日', 'http', 'https',
-                             'com', 'cn', 'www', 'html', 'org', 'net'])
-            
-            # 分词并过滤
-            words = []
-            for word in jieba.cut(text):
-                if len(word) > 1 and word not in stop_words and not word.isascii():
-                    words.append(word)
-            
-            text = ' '.join(words)
-            
-            # 生成词云
-            wordcloud = WordCloud(
-                font_path=font_path,
-                width=800,
-                height=400,
-                background_color='white',
-                max_words=100,
-                collocations=False,
-                colormap='viridis',
-                min_font_size=10,
-                max_font_size=80,
-                prefer_horizontal=0.9
-            ).generate(text)
-            
-            # 创建图形
-            plt.figure(figsize=(10, 5))
-            plt.imshow(wordcloud, interpolation='bilinear')
-            plt.axis('off')
-            
-            if not os.path.exists('charts'):
-                os.makedirs('charts')
-            output_file = f'charts/wordcloud{"_" + str(sentiment) if sentiment is not None else ""}.png'
-            plt.savefig(output_file, bbox_inches='tight', dpi=300)
-            plt.close()
-            
-            return output_file
-            
+            return self.export_wordcloud(analyzed_file, sentiment=sentiment).result()
+
         except Exception as e:
             print(f"生成词云图失败: {str(e)}")
             return None
 
+    def create_trend_chart(self, analyzed_file, style=None):
+        """生成情感趋势图（300dpi，等待绘制完成）"""
+        try:
+            return self.export_trend_chart(analyzed_file, style=style).result()
+
+        except Exception as e:
+            print(f"生成趋势图失败: {str(e)}")
+            return None
+
+    def shutdown(self):
+        """停止后台的数据准备线程和绘图进程"""
+        self._preparer.shutdown(wait=False, cancel_futures=True)
+        self.renderer.shutdown()
+
     def save_sentiment_stats(self, analyzed_file):
         """保存情感分析统计结果
         
@@ -187,7 +259,7 @@ class ChartMaker:
         """
         try:
             # 读取分析结果
-            df = pd.read_csv(analyzed_file)
+            df = read_comments(analyzed_file, columns=['sentiment'])
             
             # 统计各情感数量及占比
             stats = df['sentiment'].value_counts()
@@ -201,10 +273,8 @@ class ChartMaker:
                 report += f"{self.labels[sentiment]}: {count} 条 ({percentage:.1f}%)\n"
             report += "=" * 20 + "\n"
             
-            # 保存报告
-            if not os.path.exists('charts'):
-                os.makedirs('charts')
-            output_file = 'charts/sentiment_stats.txt'
+            # 保存报告（每份分析结果各自一个目录）
+            output_file = os.path.join(chart_dir(analyzed_file), 'sentiment_stats.txt')
             with open(output_file, 'w', encoding='utf-8') as f:
                 f.write(report)
                 
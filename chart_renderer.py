@@ -0,0 +1,162 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
+from wordcloud import WordCloud
+from config import CHART_CONFIG
+from font_finder import chinese_font_properties
+
+
+def chart_dir(dataset_file):
+    """每份分析结果的图表放在单独的目录下，不同数据集的任务不会互相覆盖"""
+    path = os.path.abspath(dataset_file)
+    digest = hashlib.blake2b(path.encode('utf-8'), digest_size=4).hexdigest()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    directory = os.path.join(CHART_CONFIG['charts_dir'], f'{stem}_{digest}')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _font(font_path, size, weight='normal'):
+    """指定字体文件时直接使用，否则用本进程缓存的中文字体"""
+    properties = FontProperties(fname=font_path) if font_path else chinese_font_properties().copy()
+    properties.set_size(size)
+    properties.set_weight(weight)
+    return properties
+
+
+def _figure(size_px, dpi, default_inches):
+    """size_px为目标控件的(宽, 高)像素时按其换算图幅，否则使用默认英寸尺寸"""
+    if size_px:
+        width, height = size_px
+        return Figure(figsize=(max(width, 50) / dpi, max(height, 50) / dpi), dpi=dpi)
+    return Figure(figsize=default_inches, dpi=dpi)
+
+
+def _save(fig, output_file, dpi, **kwargs):
+    """用Agg画布保存；先写临时文件再替换，同一文件的并发任务不会读到半张图"""
+    FigureCanvasAgg(fig)
+    temp_file = f'{output_file}.{os.getpid()}.{threading.get_ident()}.png'
+    fig.savefig(temp_file, dpi=dpi, **kwargs)
+    os.replace(temp_file, output_file)
+    return output_file
+
+
+def render_pie(data, labels, colors, output_file, dpi, font_path=None, size_px=None):
+    """绘制情感分布饼图（在工作进程中运行，不使用pyplot全局状态）"""
+    fig = _figure(size_px, dpi, (8, 6))
+    ax = fig.add_subplot()
+    # 预览图按控件大小缩放字号
+    scale = min(1.0, fig.get_figheight() / 6) if size_px else 1.0
+    ax.pie(
+        data,
+        labels=labels,
+        colors=colors,
+        autopct='%1.1f%%',
+        shadow=False,
+        textprops={'fontproperties': _font(font_path, size=12 * scale, weight='bold')},
+        startangle=90
+    )
+    ax.set_title('评论情感分布', fontproperties=_font(font_path, size=14 * scale, weight='bold'), pad=20 * scale)
+    return _save(fig, output_file, dpi, bbox_inches='tight', transparent=False)
+
+
+def render_wordcloud(frequencies, font_path, output_file, dpi, size_px=None):
+    """按词频绘制词云（在工作进程中运行）；预览时直接按控件大小布局，比先按800x400布局再缩小更快"""
+    width, height = size_px if size_px else (800, 400)
+    scale = min(1.0, max(width / 800, height / 400))
+    wordcloud = WordCloud(
+        font_path=font_path,
+        width=max(int(width), 50),
+        height=max(int(height), 50),
+        background_color='white',
+        max_words=100,
+        collocations=False,
+        colormap='viridis',
+        min_font_size=max(4, int(10 * scale)),
+        max_font_size=max(10, int(80 * scale)),
+        prefer_horizontal=0.9
+    ).generate_from_frequencies(frequencies)
+
+    fig = _figure(size_px, dpi, (10, 5))
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.imshow(wordcloud.to_array(), interpolation='bilinear')
+    ax.axis('off')
+    return _save(fig, output_file, dpi, bbox_inches='tight', pad_inches=0 if size_px else 0.1)
+
+
+def render_trend(times, counts, labels, colors, bucket_name, output_file, dpi,
+                 font_path=None, size_px=None, style='area'):
+    """绘制各情感评论数随时间的变化（在工作进程中运行）
+
+    times为各时间桶的起始时间（datetime64），counts为每种情感与times等长的计数；
+    style为'area'时画堆叠面积图，为'line'时画折线图。
+    """
+    fig = _figure(size_px, dpi, (10, 5))
+    ax = fig.add_subplot()
+    scale = min(1.0, fig.get_figheight() / 5) if size_px else 1.0
+    if style == 'line':
+        for values, label, color in zip(counts, labels, colors):
+            ax.plot(times, values, label=label, color=color, linewidth=1.5 * scale)
+    else:
+        ax.stackplot(times, *counts, labels=labels, colors=colors, alpha=0.85)
+
+    locator = AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+    ax.tick_params(labelsize=9 * scale)
+    ax.xaxis.get_offset_text().set_fontsize(9 * scale)
+    ax.set_xlim(times[0], times[-1])
+    ax.set_ylim(bottom=0)
+    ax.grid(alpha=0.3)
+    ax.set_ylabel(f'每{bucket_name}评论数', fontproperties=_font(font_path, size=10 * scale))
+    ax.legend(prop=_font(font_path, size=10 * scale), loc='upper left')
+    ax.set_title('评论情感趋势', fontproperties=_font(font_path, size=14 * scale, weight='bold'), pad=10 * scale)
+    return _save(fig, output_file, dpi, bbox_inches='tight')
+
+
+def _ready():
+    """预热用的空任务：工作进程导入本模块（matplotlib、wordcloud）后即返回"""
+    return os.getpid()
+
+
+class ChartRenderer:
+    """在后台进程池中绘制图表，返回Future
+
+    工作进程用spawn方式启动，不继承图形界面的线程与Tk状态；
+    第一次提交任务时才创建进程池，warm_up可提前启动工作进程。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or CHART_CONFIG.get('render_workers', 2)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def warm_up(self):
+        """提前启动工作进程并完成导入，第一张预览图不用等进程启动"""
+        pool = self._pool()
+        for _ in range(self.max_workers):
+            pool.submit(_ready)
+
+    def submit(self, function, *args, **kwargs):
+        return self._pool().submit(function, *args, **kwargs)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
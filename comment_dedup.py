@@ -0,0 +1,146 @@
+import random
+import re
+import zlib
+
+# 微博表情、@提及、链接以及各类标点
+EMOTICON_PATTERN = re.compile(r'\[[^\[\]]{1,10}\]')
+MENTION_PATTERN = re.compile(r'@[\w\-\u4e00-\u9fff]+')
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+PUNCTUATION_PATTERN = re.compile(r'[^\w\u4e00-\u9fff\[\]]+')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_comment(text):
+    """规范化评论：去掉表情、@提及、链接、标点和空白，英文转小写
+
+    只剩表情的评论保留表情本身，避免所有纯表情评论被归为一类。
+    """
+    text = str(text)
+    stripped = URL_PATTERN.sub('', text)
+    stripped = MENTION_PATTERN.sub('', stripped)
+    without_emoticons = EMOTICON_PATTERN.sub('', stripped)
+    normalized = PUNCTUATION_PATTERN.sub('', without_emoticons).lower()
+    if normalized:
+        return normalized
+    return PUNCTUATION_PATTERN.sub('', stripped).lower()
+
+
+class CommentClusterer:
+    """基于字符shingle + MinHash/LSH的近似重复评论聚类
+
+    先按规范化文本做精确去重，再对剩余文本用LSH找候选，
+    与候选代表的Jaccard相似度达到阈值即归入同一类。
+
+    规范化后为空的评论（只有@或链接）各自单独成类；短于min_length的只做精确去重；
+    短于short_length的用short_threshold比较——短评论差一个字（如句末的"吗"）意思可能完全不同。
+    """
+
+    def __init__(self, threshold=0.8, shingle_size=3, num_perm=32, bands=8,
+                 min_length=5, short_length=20, short_threshold=0.95):
+        if num_perm % bands:
+            raise ValueError("num_perm必须能被bands整除")
+        self.threshold = threshold
+        self.min_length = min_length
+        self.short_length = short_length
+        self.short_threshold = short_threshold
+        self.shingle_size = shingle_size
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(42)
+        self.permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        self.reset()
+
+    def reset(self):
+        """清空已有的类别"""
+        self.exact = {}            # 规范化文本 -> 类别编号
+        self.representatives = []  # 类别编号 -> (代表的shingle集合, 代表的规范化长度)
+        self.buckets = {}          # LSH桶 -> 类别编号列表
+
+    @property
+    def cluster_count(self):
+        return len(self.representatives)
+
+    def _shingles(self, text):
+        if len(text) <= self.shingle_size:
+            return {text}
+        return {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+
+    def _signature(self, shingles):
+        hashes = [zlib.crc32(s.encode('utf-8')) for s in shingles]
+        return [
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self.permutations
+        ]
+
+    def _band_keys(self, signature):
+        return [
+            (band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def _jaccard(a, b):
+        return len(a & b) / len(a | b) if a or b else 1.0
+
+    def cluster(self, texts):
+        """对评论聚类
+
+        Returns:
+            与texts等长的类别编号列表，同一类的评论编号相同，编号按首次出现顺序递增
+        """
+        self.reset()
+        return self.extend(texts)
+
+    def extend(self, texts):
+        """在已有的类别上继续聚类（流水线模式中逐批到达的评论与之前的批次去重），返回与texts等长的类别编号"""
+        labels = []
+        exact = self.exact
+        representatives = self.representatives
+        buckets = self.buckets
+
+        for text in texts:
+            normalized = normalize_comment(text)
+            if not normalized:
+                # 没有可比较的内容，不与任何评论合并
+                labels.append(len(representatives))
+                representatives.append((set(), 0))
+                continue
+            if normalized in exact:
+                labels.append(exact[normalized])
+                continue
+
+            shingles = self._shingles(normalized)
+            fuzzy = len(normalized) >= self.min_length
+            band_keys = self._band_keys(self._signature(shingles)) if fuzzy else []
+
+            cluster_id = None
+            seen = set()
+            for key in band_keys:
+                for candidate in buckets.get(key, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    candidate_shingles, candidate_length = representatives[candidate]
+                    shorter = min(len(normalized), candidate_length)
+                    threshold = self.short_threshold if shorter < self.short_length else self.threshold
+                    if self._jaccard(shingles, candidate_shingles) >= threshold:
+                        cluster_id = candidate
+                        break
+                if cluster_id is not None:
+                    break
+
+            if cluster_id is None:
+                cluster_id = len(representatives)
+                representatives.append((shingles, len(normalized)))
+                for key in band_keys:
+                    buckets.setdefault(key, []).append(cluster_id)
+
+            exact[normalized] = cluster_id
+            labels.append(cluster_id)
+
+        return labels
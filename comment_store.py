@@ -0,0 +1,243 @@
+import argparse
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from config import STORAGE_CONFIG
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow是可选依赖，没有安装时只能使用CSV
+    pa = None
+    pq = None
+
+# 微博接口返回的时间格式
+WEIBO_TIME_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+WEIBO_TIMEZONE = 'Asia/Shanghai'
+
+# 'Thu Oct 15 10:00:00 +0800 2026' 中各字段的位置
+_WEIBO_TIME_LENGTH = 30
+_MONTHS = np.array([b'Jan', b'Feb', b'Mar', b'Apr', b'May', b'Jun',
+                    b'Jul', b'Aug', b'Sep', b'Oct', b'Nov', b'Dec'])
+_MONTH_ORDER = np.argsort(_MONTHS)
+_DIGITS = [26, 27, 28, 29, 8, 9, 11, 12, 14, 15, 17, 18, 21, 22, 23, 24]
+_SEPARATOR_POSITIONS = [3, 7, 10, 13, 16, 19, 25]
+_SEPARATORS = np.frombuffer(b'   ::  ', dtype=np.uint8)
+# 数字位按权相加得到 年、日、当天秒数、时区偏移秒数（都小于2**24，float32可精确表示）
+_WEIGHTS = np.zeros((len(_DIGITS), 4), dtype=np.float32)
+_WEIGHTS[0:4, 0] = [1000, 100, 10, 1]
+_WEIGHTS[4:6, 1] = [10, 1]
+_WEIGHTS[6:12, 2] = [36000, 3600, 600, 60, 10, 1]
+_WEIGHTS[12:16, 3] = [36000, 3600, 600, 60]
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_ENTRIES = 4
+_warned = False
+
+
+def storage_format():
+    """配置的存储格式；配置为parquet但没有安装pyarrow时退回csv"""
+    global _warned
+    fmt = STORAGE_CONFIG.get('format', 'csv')
+    if fmt == 'parquet' and pq is None:
+        if not _warned:
+            print("未安装pyarrow，改用CSV存储（pip install pyarrow 后可使用Parquet）")
+            _warned = True
+        return 'csv'
+    return fmt
+
+
+def _id_column(series):
+    """评论ID全是不超过18位的整数时用int64（可空），否则保留字符串"""
+    values = series.dropna().astype(str)
+    if values.str.fullmatch(r'-?\d{1,18}').all():
+        return pd.to_numeric(series).astype('Int64')
+    return series.astype('string')
+
+
+def _parse_fixed(texts):
+    """按固定位置解析长度为30的微博时间，返回(UTC秒数, 是否有效)"""
+    rows = np.frombuffer(
+        ('\n'.join(texts) + '\n').encode('ascii', 'replace'), dtype=np.uint8
+    ).reshape(len(texts), _WEIBO_TIME_LENGTH + 1)
+    digits = rows[:, _DIGITS] - np.uint8(48)
+    valid = (digits.max(axis=1) <= 9) & (rows[:, _SEPARATOR_POSITIONS] == _SEPARATORS).all(axis=1)
+    valid &= (rows[:, 20] == ord('+')) | (rows[:, 20] == ord('-'))
+
+    months = np.ascontiguousarray(rows[:, 4:7]).view('S3').ravel()
+    month = _MONTH_ORDER[np.searchsorted(_MONTHS[_MONTH_ORDER], months).clip(0, 11)]
+    valid &= _MONTHS[month] == months
+
+    year, day, clock, offset = (digits.astype(np.float32) @ _WEIGHTS).astype(np.int64).T
+    offset = np.where(rows[:, 20] == ord('-'), -offset, offset)
+    dates = ((year - 1970) * 12 + month).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    return (dates + day - 1) * 86400 + clock - offset, valid
+
+
+def parse_weibo_times(values):
+    """把created_at列解析为Asia/Shanghai时区的时间，无法解析的为NaT
+
+    微博时间是定长的 'Thu Oct 15 10:00:00 +0800 2026'：把整列拼成一块字节后按固定位置
+    向量化取出各字段，不逐行调用strptime（比pandas按格式解析快五倍以上）；
+    长度或格式不符的（如从Parquet写回的ISO时间）再交给pandas解析。
+    """
+    series = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if series.dt.tz is None:
+            series = series.dt.tz_localize('UTC')
+        return series.dt.tz_convert(WEIBO_TIMEZONE)
+    if len(series) == 0:
+        return pd.Series(pd.DatetimeIndex([], tz=WEIBO_TIMEZONE), index=series.index)
+
+    texts = series.to_numpy(dtype=object)
+    present = series.notna().to_numpy()
+    stamps = np.full(len(texts), np.datetime64('NaT'), dtype='datetime64[s]')
+    parsed = np.zeros(len(texts), dtype=bool)
+
+    if present.all() and sum(map(len, texts)) == len(texts) * _WEIBO_TIME_LENGTH:
+        seconds, parsed = _parse_fixed(texts.tolist())
+        stamps[parsed] = seconds[parsed].astype('datetime64[s]')
+    else:
+        lengths = np.fromiter((len(text) if ok else 0 for text, ok in zip(texts, present)),
+                              dtype=np.int64, count=len(texts))
+        fixed = np.flatnonzero(lengths == _WEIBO_TIME_LENGTH)
+        if len(fixed):
+            seconds, valid = _parse_fixed(texts[fixed].tolist())
+            parsed[fixed[valid]] = True
+            stamps[fixed[valid]] = seconds[valid].astype('datetime64[s]')
+
+    result = pd.Series(pd.DatetimeIndex(stamps).tz_localize('UTC'), index=series.index)
+    retry = present & ~parsed
+    if retry.any():
+        others = series[retry].astype(str)
+        fallback = pd.to_datetime(others, format=WEIBO_TIME_FORMAT, errors='coerce', utc=True)
+        missing = fallback.isna()
+        if missing.any():
+            # 从Parquet读出再写回的时间是ISO格式
+            fallback[missing] = pd.to_datetime(others[missing], format='ISO8601', errors='coerce', utc=True)
+        result[retry] = fallback
+    return result.dt.tz_convert(WEIBO_TIMEZONE)
+
+
+def _typed(df):
+    """转换为带类型的列：int64的ID与点赞数、int8的情感值、带时区的发布时间"""
+    df = df.copy()
+    for column in ('comment_id', 'parent_id'):
+        if column in df.columns:
+            df[column] = _id_column(df[column].replace('', None))
+    if 'like_count' in df.columns:
+        df['like_count'] = pd.to_numeric(df['like_count'], errors='coerce').fillna(0).astype('int64')
+    if 'sentiment' in df.columns:
+        df['sentiment'] = pd.to_numeric(df['sentiment'], errors='coerce').fillna(-1).astype('int8')
+    if 'created_at' in df.columns:
+        parsed = parse_weibo_times(df['created_at'])
+        # 有无法解析的时间时保留原始字符串，不丢信息
+        if parsed[df['created_at'].notna()].notna().all():
+            df['created_at'] = parsed
+        else:
+            df['created_at'] = df['created_at'].astype('string')
+    for column in ('content', 'user_name'):
+        if column in df.columns:
+            df[column] = df[column].astype('string')
+    return df
+
+
+def _untyped(df):
+    """导出CSV前把时间还原成微博的原始格式"""
+    df = df.copy()
+    if 'created_at' in df.columns and pd.api.types.is_datetime64_any_dtype(df['created_at']):
+        df['created_at'] = df['created_at'].dt.strftime(WEIBO_TIME_FORMAT)
+    return df
+
+
+def read_comments(path, columns=None):
+    """读取评论或分析结果（CSV或Parquet）
+
+    Args:
+        path: 文件路径，按扩展名判断格式
+        columns: 只读取这些列（文件中不存在的列忽略），None表示全部
+
+    最近读过的几个文件按(路径, 修改时间, 列)缓存，同一次点击中重复读取不会再访问磁盘；
+    返回的是副本，调用方可以随意修改。
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, tuple(columns) if columns else None)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key].copy()
+
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("读取Parquet文件需要安装pyarrow")
+        if columns:
+            available = pq.read_schema(path).names
+            columns = [c for c in columns if c in available]
+        df = pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    else:
+        usecols = (lambda c: c in columns) if columns else None
+        df = pd.read_csv(path, usecols=usecols, dtype={'parent_id': str})
+
+    with _cache_lock:
+        _cache[key] = df
+        while len(_cache) > _CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return df.copy()
+
+
+def write_parquet(df, path):
+    """按类型写入Parquet（先写临时文件再替换，不会留下半个文件）"""
+    if pq is None:
+        raise ImportError("写入Parquet文件需要安装pyarrow")
+    table = pa.Table.from_pandas(_typed(df), preserve_index=False)
+    temp_file = path + '.tmp'
+    pq.write_table(table, temp_file, compression='zstd')
+    os.replace(temp_file, path)
+    return path
+
+
+def finalize(csv_file, keep_csv=False):
+    """按配置的存储格式处理刚写好的CSV
+
+    存储格式为parquet时转换为同名的.parquet文件并返回其路径；
+    keep_csv为False时删除CSV（需要时可用export_csv重新导出）。
+    """
+    if storage_format() != 'parquet':
+        return csv_file
+    parquet_file = os.path.splitext(csv_file)[0] + '.parquet'
+    write_parquet(pd.read_csv(csv_file, dtype={'parent_id': str}), parquet_file)
+    if not keep_csv:
+        os.remove(csv_file)
+    return parquet_file
+
+
+def export_csv(path, output_file=None):
+    """把Parquet文件导出为与爬虫/分析输出格式相同的CSV"""
+    output_file = output_file or os.path.splitext(path)[0] + '.csv'
+    df = _untyped(read_comments(path))
+    df.to_csv(output_file, index=False, encoding='utf-8-sig')
+    return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description='评论文件在CSV与Parquet之间转换')
+    parser.add_argument('command', choices=['to-parquet', 'to-csv'])
+    parser.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    for path in args.files:
+        if args.command == 'to-parquet':
+            output_file = write_parquet(
+                pd.read_csv(path, dtype={'parent_id': str}),
+                os.path.splitext(path)[0] + '.parquet'
+            )
+        else:
+            output_file = export_csv(path)
+        print(f"{path} -> {output_file}")
+
+
+if __name__ == '__main__':
+    main()
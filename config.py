@@ -6,30 +6,91 @@ ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 # 微博爬虫配置
 CRAWLER_CONFIG = {
     'output_dir': os.path.join(ROOT_DIR, 'data/raw_comments'),
+    'checkpoint_dir': os.path.join(ROOT_DIR, 'data/checkpoints'),  # 每条微博的爬取位置，每页更新，重启后可继续
+    'base_url': 'https://weibo.com',  # 改为 http_replay.py 替身服务器的地址即可离线测试
+    'record_dir': '',                 # 非空时把微博接口的请求和响应录制到该目录，供 http_replay.py 回放
     'headers': {
         'User-Agent': '',  # 移除默认值
         'Cookie': '',
         'Referer': ''
     },
-    'sleep_time': 1.0
+    'max_workers': 4,                # crawl_posts 同时爬取的微博数
+    # 每组凭据对同一主机的请求间隔（秒），所有爬取线程共享；响应正常时每次缩短 delay_step，
+    # 出现HTTP错误、非JSON响应或跳转登录时乘以 delay_backoff，始终保持在[min_delay, max_delay]内
+    'initial_delay': 1.0,
+    'min_delay': 0.2,
+    'max_delay': 30.0,
+    'delay_step': 0.1,
+    'delay_backoff': 2.0,
+    'max_retries': 3,                # 单个页面出错后的最大重试次数（每次重试可能换一组凭据）
+    'profile_max_failures': 3,       # 一组凭据连续出错这么多次后暂停使用
+    'profile_rest_seconds': 60,      # 凭据被限流（429/418）或连续出错后的休息时间，服务端给出Retry-After时以其为准
+    'crawl_replies': False,          # 同时爬取有回复的一级评论下的楼中楼回复
+    'reply_workers': 4,              # 爬取回复的线程数
+    'connect_timeout': 5,            # 建立连接超时（秒）
+    'read_timeout': 30,              # 等待响应超时（秒）
+    'log_level': 'INFO'              # DEBUG: 额外打印原文接口的完整响应；WARNING: 不打印每页进度
+}
+
+# 评论与分析结果的存储格式
+STORAGE_CONFIG = {
+    # csv: 与之前相同的utf-8-sig CSV；
+    # parquet: 带类型的列式存储（需要pyarrow），图表只读取需要的列。爬虫仍以CSV边爬边追加，
+    # 爬完后另存一份Parquet；分析结果直接保存为Parquet，可用 python comment_store.py to-csv 导出CSV
+    'format': 'csv'
 }
 
 # DeepSeek API配置
 ANALYZER_CONFIG = {
     'api_key': '',  # 运行时从UI获取
-    'output_dir': os.path.join(ROOT_DIR, 'data/analyzed_comments')
+    'output_dir': os.path.join(ROOT_DIR, 'data/analyzed_comments'),
+    'max_workers': 4,            # 同时在途的API请求数
+    'requests_per_second': 5,    # 每秒最多发起的请求数，0表示不限制
+    'tokens_per_minute': 0,      # 每分钟最多消耗的token数（估算），0表示不限制
+    'batch_size': 1,             # 每次请求判断的评论条数，1表示逐条分析
+    'model': 'deepseek-reasoner',
+    'prompt_version': 'v1',      # 修改提示词后请递增，旧缓存随之失效
+    'cache_enabled': True,       # 是否启用跨运行的情感结果缓存
+    'cache_path': os.path.join(ROOT_DIR, 'data/sentiment_cache.sqlite3'),
+    'cache_max_entries': 200000, # 缓存条目上限，超出后淘汰最久未使用的条目
+    'dedup_enabled': True,       # 近似重复评论只分析一条代表
+    'dedup_threshold': 0.8,      # 规范化后字符shingle的Jaccard相似度阈值
+    'cascade_enabled': False,    # 先用本地模型判断，只把没把握的评论交给大模型
+    'cascade_threshold': 0.9,    # 本地模型置信度达到该值才直接采用
+    'local_model_path': os.path.join(ROOT_DIR, 'data/local_model.json'),  # 由 local_classifier.py 训练生成
+    'journal_flush_every': 50,   # 结果日志每写入多少条fsync一次
+    'pipeline_queue_size': 10,   # 边爬边分析时爬虫与分析之间最多缓存的评论页数，队列满时爬虫等待
+    'api_url': 'https://api.deepseek.com/chat/completions',
+    'record_dir': '',            # 非空时把对话接口的请求和响应录制到该目录，供 http_replay.py 回放
+    'pool_size': 0,              # HTTP连接池大小，0表示与max_workers一致
+    'connect_timeout': 5,        # 建立连接超时（秒）
+    'read_timeout': 30,          # 等待响应超时（秒）
+    'max_retries': 3,            # 可重试错误（超时、429、5xx）的最大重试次数
+    'retry_base_delay': 1.0,     # 指数退避的基准等待（秒），实际等待带随机抖动
+    'retry_max_delay': 60.0,     # 单次等待上限（秒）
+    'breaker_failure_threshold': 5,  # 连续失败多少次后熔断，暂停所有请求
+    'breaker_cooldown': 30.0,    # 熔断后暂停的秒数
+    'unclassified_retry_rounds': 2   # 未分类评论在整轮结束后的重试轮数
 }
 
 # 可视化配置
 CHART_CONFIG = {
     'charts_dir': os.path.join(ROOT_DIR, 'charts'),
     'chart_size': (640, 480),
+    'preview_dpi': 100,     # 界面中预览图的分辨率，按显示区域大小绘制
+    'export_dpi': 300,      # 导出高清图的分辨率
+    'render_workers': 2,    # 后台绘图进程数，饼图与词云可以同时绘制
+    'font_path': '',        # 指定中文字体文件；为空时自动查找（平台常见路径、fontconfig、系统字体目录）
+    'font_cache': os.path.join(ROOT_DIR, 'data/font_cache.json'),  # 自动查找到的字体路径，下次启动直接使用
+    'trend_max_buckets': 200,  # 趋势图最多的时间桶数，按评论时间跨度在分钟/小时/天之间选择
+    'trend_style': 'area',     # 趋势图样式：area为堆叠面积图，line为折线图
     'colors': {
         'positive': '#2ecc71',
         'neutral': '#95a5a6',
         'negative': '#e74c3c'
     },
     'labels': {
+        -1: '未分类',
         0: '积极',
         1: '中性', 
         2: '消极'
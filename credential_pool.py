@@ -0,0 +1,194 @@
+import threading
+import time
+from urllib.parse import urlparse
+from config import CRAWLER_CONFIG
+from http_client import create_session
+from http_replay import attach_recorder
+from rate_limiter import AdaptiveThrottle
+
+
+def build_headers(user_agent, cookie, referer):
+    """按浏览器发出的AJAX请求构造请求头"""
+    return {
+        'User-Agent': user_agent,
+        'Cookie': cookie,
+        'Referer': referer,
+        'X-Requested-With': 'XMLHttpRequest',
+        'Accept': 'application/json, text/plain, */*',
+        'Accept-Language': 'zh-CN,zh;q=0.9',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Connection': 'keep-alive'
+    }
+
+
+class CredentialProfile:
+    """一组凭据（User-Agent + Cookie）：独立的会话、请求间隔与健康状态"""
+
+    def __init__(self, name, headers, session, config):
+        self.name = name
+        self.headers = headers
+        self.session = session
+        self.config = config
+        self.throttles = {}  # 主机 -> AdaptiveThrottle，每组凭据各自控制请求间隔
+        self.expired = False  # 跳转登录或接口返回未登录，不再使用
+        self.rest_until = 0.0  # 被限流或连续出错后暂停使用到这个时刻
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.rests = 0
+        self.first_used = None
+        self.last_used = None
+        self.last_error = None
+
+    def throttle(self, host):
+        throttle = self.throttles.get(host)
+        if throttle is None:
+            throttle = self.throttles[host] = AdaptiveThrottle(
+                initial_delay=self.config.get('initial_delay', 1.0),
+                min_delay=self.config.get('min_delay', 0.2),
+                max_delay=self.config.get('max_delay', 30.0),
+                step=self.config.get('delay_step', 0.1),
+                backoff=self.config.get('delay_backoff', 2.0)
+            )
+        return throttle
+
+    def state(self, now=None):
+        if self.expired:
+            return '已失效'
+        if self.rest_until > (now or time.monotonic()):
+            return '休息中'
+        return '正常'
+
+    def summary(self):
+        elapsed = (self.last_used - self.first_used) if self.first_used is not None else 0.0
+        return {
+            'name': self.name,
+            'state': self.state(),
+            'requests': self.requests,
+            'successes': self.successes,
+            'failures': self.failures,
+            'rests': self.rests,
+            'requests_per_second': self.successes / elapsed if elapsed > 0 else 0.0,
+            'delays': {host: throttle.delay for host, throttle in self.throttles.items()},
+            'last_error': self.last_error
+        }
+
+
+class CredentialPool:
+    """多组凭据轮换：每次请求交给最早可以发送的正常凭据
+
+    被限流（429/418）或连续出错 profile_max_failures 次的凭据休息 profile_rest_seconds 秒
+    （服务端给出Retry-After时以其为准），登录失效的凭据不再使用。
+    """
+
+    def __init__(self, stats=None, pool_size=1, config=None):
+        self.config = config or CRAWLER_CONFIG
+        self.stats = stats
+        self.pool_size = pool_size
+        self.profiles = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def clear(self):
+        with self.lock:
+            for profile in self.profiles:
+                profile.session.close()
+            self.profiles = []
+
+    def add(self, user_agent, cookie, referer, name=None):
+        """添加一组凭据，返回对应的CredentialProfile"""
+        session = create_session(self.pool_size, self.stats)
+        if self.config.get('record_dir'):
+            attach_recorder(session, self.config['record_dir'])
+        with self.lock:
+            profile = CredentialProfile(
+                name or f'凭据{len(self.profiles) + 1}',
+                build_headers(user_agent, cookie, referer),
+                session,
+                self.config
+            )
+            self.profiles.append(profile)
+        return profile
+
+    def acquire(self, url, is_running=None):
+        """选出一组可用的凭据并等到它可以发送请求
+
+        所有凭据都在休息时等到最早恢复的那组；全部失效时抛出ValueError；
+        等待期间is_running()返回False时抛出InterruptedError。
+        """
+        host = urlparse(url).netloc
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                usable = [p for p in self.profiles if not p.expired]
+                if not usable:
+                    raise ValueError("所有凭据都已失效，请重新获取Cookie")
+                ready = [p for p in usable if p.rest_until <= now]
+                if ready:
+                    profile = min(ready, key=lambda p: p.throttle(host).next_at)
+                    wait = profile.throttle(host).reserve()
+                    profile.requests += 1
+                    if profile.first_used is None:
+                        profile.first_used = now
+                    break
+                wait = min(p.rest_until for p in usable) - now
+            # 所有凭据都在休息，分段等待以便及时响应停止
+            if is_running is not None and not is_running():
+                raise InterruptedError("爬取已停止")
+            time.sleep(min(wait, 0.5))
+        if wait > 0:
+            time.sleep(wait)
+        return profile
+
+    def record_success(self, profile, url):
+        delay = profile.throttle(urlparse(url).netloc).record_success()
+        with self.lock:
+            profile.successes += 1
+            profile.consecutive_failures = 0
+            profile.last_used = time.monotonic()
+        return delay
+
+    def record_failure(self, profile, url, error, status_code=None, retry_after=None, expired=False):
+        """记录一次失败，返回该凭据调整后的请求间隔"""
+        delay = profile.throttle(urlparse(url).netloc).record_failure()
+        with self.lock:
+            now = time.monotonic()
+            profile.failures += 1
+            profile.consecutive_failures += 1
+            profile.last_used = now
+            profile.last_error = str(error)
+            if expired:
+                if not profile.expired:
+                    profile.expired = True
+                    print(f"{profile.name} 登录已失效，不再使用")
+            elif status_code in (418, 429) or \
+                    profile.consecutive_failures >= self.config.get('profile_max_failures', 3):
+                rest = retry_after if retry_after is not None else self.config.get('profile_rest_seconds', 60)
+                profile.rest_until = now + rest
+                profile.consecutive_failures = 0
+                profile.rests += 1
+                print(f"{profile.name} 被限流或连续出错，休息 {rest:.0f} 秒")
+        return delay
+
+    def current_delay(self, url):
+        """该主机当前最短的请求间隔（秒）"""
+        host = urlparse(url).netloc
+        with self.lock:
+            delays = [p.throttle(host).delay for p in self.profiles if not p.expired]
+        return min(delays) if delays else 0.0
+
+    def summary(self):
+        with self.lock:
+            return [profile.summary() for profile in self.profiles]
+
+    def describe(self):
+        lines = []
+        for s in self.summary():
+            lines.append(
+                f"{s['name']}（{s['state']}）: 请求 {s['requests']} 次，成功 {s['successes']}，"
+                f"失败 {s['failures']}，休息 {s['rests']} 次，{s['requests_per_second']:.1f} 次/秒"
+            )
+        return '\n'.join(lines)
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from matplotlib import ft2font
+from matplotlib.font_manager import FontProperties, findSystemFonts
+from config import CHART_CONFIG
+
+# 各平台常见中文字体，按优先级排列
+KNOWN_FONTS = {
+    'win32': [
+        'C:/Windows/Fonts/simhei.ttf',  # 黑体
+        'C:/Windows/Fonts/SIMYOU.TTF',  # 幼圆
+        'C:/Windows/Fonts/simsun.ttc',  # 宋体
+        'C:/Windows/Fonts/msyh.ttc',    # 微软雅黑
+    ],
+    'darwin': [
+        '/System/Library/Fonts/PingFang.ttc',
+        '/System/Library/Fonts/STHeiti Medium.ttc',
+        '/System/Library/Fonts/STHeiti Light.ttc',
+        '/Library/Fonts/Arial Unicode.ttf',
+    ],
+    'linux': [
+        '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+        '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+        '/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc',
+        '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+        '/usr/share/fonts/wqy-microhei/wqy-microhei.ttc',
+        '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+        '/usr/share/fonts/wqy-zenhei/wqy-zenhei.ttc',
+        '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf',
+        '/usr/share/fonts/adobe-source-han-sans/SourceHanSansCN-Regular.otf',
+    ]
+}
+
+# 文件名中出现这些关键字的字体优先检查
+CJK_NAME_HINTS = ('cjk', 'wqy', 'simhei', 'simsun', 'msyh', 'yahei', 'pingfang', 'heiti',
+                  'sourcehan', 'source-han', 'droidsansfallback', 'ukai', 'uming', 'hei', 'song')
+
+# 能显示这些字才算中文字体
+_SAMPLE = '中文评论积极消极'
+
+_resolved = {}
+_lock = threading.Lock()
+
+
+def supports_chinese(path):
+    """字体文件是否包含常用汉字的字形"""
+    try:
+        charmap = ft2font.FT2Font(path).get_charmap()
+    except Exception:
+        return False
+    return all(ord(char) in charmap for char in _SAMPLE)
+
+
+def _fontconfig_fonts():
+    """fontconfig中声明支持中文的字体文件"""
+    if not shutil.which('fc-list'):
+        return []
+    try:
+        output = subprocess.run(
+            ['fc-list', ':lang=zh', 'file'], capture_output=True, text=True, timeout=10
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    return sorted(line.split(':')[0].strip() for line in output.splitlines() if line.strip())
+
+
+def _candidates():
+    """按优先级生成候选字体：平台常见路径、fontconfig、系统字体目录中名字像中文字体的、其余字体"""
+    platform = 'linux' if sys.platform.startswith('linux') else sys.platform
+    yield from KNOWN_FONTS.get(platform, [])
+    yield from _fontconfig_fonts()
+    system_fonts = sorted(findSystemFonts())
+    hinted = [path for path in system_fonts
+              if any(hint in os.path.basename(path).lower().replace(' ', '') for hint in CJK_NAME_HINTS)]
+    yield from hinted
+    yield from (path for path in system_fonts if path not in hinted)
+
+
+def _read_disk_cache(cache_file):
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            path = json.load(f).get('path')
+    except (OSError, ValueError, AttributeError):
+        return None
+    return path if path and os.path.exists(path) else None
+
+
+def _write_disk_cache(cache_file, path):
+    try:
+        directory = os.path.dirname(cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({'path': path}, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"保存字体缓存失败: {str(e)}")
+
+
+def find_chinese_font(refresh=False):
+    """查找可用的中文字体路径，找不到时返回None
+
+    顺序：配置中的 font_path、磁盘缓存、平台常见路径、fontconfig、系统字体目录；
+    结果在本进程内缓存，查找到的路径同时写入磁盘缓存，下次启动不再扫描。
+    """
+    with _lock:
+        if 'path' in _resolved and not refresh:
+            return _resolved['path']
+
+        path = CHART_CONFIG.get('font_path') or None
+        if path and not os.path.exists(path):
+            print(f"配置的字体不存在: {path}，改为自动查找")
+            path = None
+
+        cache_file = CHART_CONFIG.get('font_cache')
+        if path is None and cache_file and not refresh:
+            path = _read_disk_cache(cache_file)
+
+        if path is None:
+            checked = set()
+            for candidate in _candidates():
+                if candidate in checked or not os.path.exists(candidate):
+                    continue
+                checked.add(candidate)
+                if supports_chinese(candidate):
+                    path = candidate
+                    break
+            if path is not None and cache_file:
+                _write_disk_cache(cache_file, path)
+            elif path is None:
+                print("未找到可用的中文字体，可安装 fonts-noto-cjk 或 fonts-wqy-microhei，"
+                      "或在 CHART_CONFIG['font_path'] 中指定字体文件")
+
+        _resolved['path'] = path
+        _resolved.pop('properties', None)
+        return path
+
+
+def chinese_font_properties():
+    """中文字体的FontProperties（本进程内只创建一次），没有中文字体时按字体族名回退"""
+    path = find_chinese_font()
+    with _lock:
+        if 'properties' not in _resolved:
+            _resolved['properties'] = (
+                FontProperties(fname=path) if path else FontProperties(family=['SimHei', 'sans-serif'])
+            )
+        return _resolved['properties']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查找图表使用的中文字体')
+    parser.add_argument('--refresh', action='store_true', help='忽略缓存重新查找')
+    args = parser.parse_args()
+    path = find_chinese_font(refresh=args.refresh)
+    print(path or '未找到中文字体')
+
+
+if __name__ == '__main__':
+    main()
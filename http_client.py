@@ -0,0 +1,152 @@
+import argparse
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class ConnectionStats:
+    """统计新建连接（TCP+TLS握手）与请求本身的耗时"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.connect_time = 0.0
+        self.requests = 0
+        self.request_time = 0.0
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.connect_time = 0.0
+            self.requests = 0
+            self.request_time = 0.0
+
+    def record_connect(self, seconds):
+        with self.lock:
+            self.connections += 1
+            self.connect_time += seconds
+
+    def record_request(self, seconds):
+        with self.lock:
+            self.requests += 1
+            self.request_time += seconds
+
+    def summary(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'connections': self.connections,
+                'avg_connect_ms': self.connect_time / self.connections * 1000 if self.connections else 0.0,
+                'avg_request_ms': self.request_time / self.requests * 1000 if self.requests else 0.0
+            }
+
+    def describe(self):
+        s = self.summary()
+        return (f"{s['requests']} 次请求，新建连接 {s['connections']} 次，"
+                f"平均握手 {s['avg_connect_ms']:.1f} ms，平均请求 {s['avg_request_ms']:.1f} ms")
+
+
+def _timed(connection_cls, stats):
+    """生成一个在connect时记录握手耗时的连接类"""
+    class TimedConnection(connection_cls):
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            stats.record_connect(time.perf_counter() - start)
+    return TimedConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """连接池适配器：复用keep-alive连接，并单独记录握手耗时"""
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        http_pool = type('TimedHTTPConnectionPool', (HTTPConnectionPool,), {
+            'ConnectionCls': _timed(HTTPConnection, self.stats)
+        })
+        https_pool = type('TimedHTTPSConnectionPool', (HTTPSConnectionPool,), {
+            'ConnectionCls': _timed(HTTPSConnection, self.stats)
+        })
+        self.poolmanager.pool_classes_by_scheme = {'http': http_pool, 'https': https_pool}
+
+
+def create_session(pool_size, stats=None):
+    """创建所有工作线程共用的Session
+
+    Args:
+        pool_size: 每个主机保持的最大连接数，一般等于并发数
+        stats: ConnectionStats，不传则新建
+    """
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(
+        stats if stats is not None else ConnectionStats(),
+        pool_connections=4,
+        pool_maxsize=max(1, int(pool_size)),
+        pool_block=True
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _start_stub_server():
+    """本地桩服务器：对任何POST返回一个固定的chat-completion结果"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = b'{"choices": [{"message": {"content": "1"}}]}'
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchmark(calls=200):
+    """对比每次新建连接与连接池复用的单次调用开销"""
+    server = _start_stub_server()
+    url = f'http://127.0.0.1:{server.server_address[1]}/chat/completions'
+    payload = {'model': 'stub', 'messages': [{'role': 'user', 'content': '你好'}]}
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        requests.post(url, json=payload, timeout=5)
+    fresh = (time.perf_counter() - start) / calls * 1000
+
+    stats = ConnectionStats()
+    session = create_session(1, stats)
+    start = time.perf_counter()
+    for _ in range(calls):
+        session.post(url, json=payload, timeout=5)
+    pooled = (time.perf_counter() - start) / calls * 1000
+
+    server.shutdown()
+    print(f"每次新建连接: {fresh:.2f} ms/次")
+    print(f"连接池复用:   {pooled:.2f} ms/次（新建连接 {stats.connections} 次）")
+    print(f"每次调用节省: {fresh - pooled:.2f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='连接池基准测试（本地桩服务器）')
+    parser.add_argument('--calls', type=int, default=200)
+    benchmark(parser.parse_args().calls)
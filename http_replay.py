@@ -0,0 +1,346 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+from rate_limiter import TokenBucket
+
+
+def _body_for_key(body):
+    """请求体中参与匹配的部分：对话接口只看模型和消息，其余参数不影响结果"""
+    if not body:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', errors='replace')
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if isinstance(data, dict) and 'messages' in data:
+        return {'model': data.get('model'), 'messages': data.get('messages')}
+    return data
+
+
+def exchange_key(method, url, body=None):
+    """根据方法、路径、查询参数和请求体生成一次交换的匹配键"""
+    parsed = urlparse(url)
+    query = sorted(parse_qsl(parsed.query, keep_blank_values=True))
+    raw = json.dumps([method.upper(), parsed.path, query, _body_for_key(body)],
+                     ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class ExchangeRecorder:
+    """把Session发出的请求和收到的响应追加记录到 <directory>/exchanges.jsonl
+
+    只记录方法、路径、查询参数和响应，不记录请求头（Cookie、API Key不会落盘）。
+    """
+
+    def __init__(self, directory):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = os.path.join(directory, 'exchanges.jsonl')
+        self.lock = threading.Lock()
+
+    def record(self, response, *args, **kwargs):
+        """requests的response钩子"""
+        request = response.request
+        parsed = urlparse(request.url)
+        entry = {
+            'key': exchange_key(request.method, request.url, request.body),
+            'method': request.method,
+            'path': parsed.path,
+            'query': parsed.query,
+            'status': response.status_code,
+            'headers': {
+                name: response.headers[name]
+                for name in ('Content-Type', 'Retry-After') if name in response.headers
+            },
+            'body': response.text
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        return response
+
+
+def attach_recorder(session, directory):
+    """让session的所有响应都被记录下来"""
+    recorder = ExchangeRecorder(directory)
+    session.hooks['response'].append(recorder.record)
+    return recorder
+
+
+class StandInServer:
+    """微博与DeepSeek接口的本地替身
+
+    优先回放录制的响应；没有录制时微博接口按synthetic_pages生成假评论，
+    对话接口按提示中的评论条数生成确定性的情感标签。
+    可以模拟延迟、随机错误（503）和限流（429 + Retry-After）；与真实接口一样，
+    限流按凭据（Cookie或Authorization）分别计算，expired_credentials中的Cookie返回未登录。
+    """
+
+    def __init__(self, recording=None, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 rate_limit=0.0, synthetic_pages=0, page_size=20, seed=None, expired_credentials=()):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.buckets = {}  # 凭据 -> TokenBucket
+        self.expired_credentials = set(expired_credentials)
+        self.synthetic_pages = synthetic_pages
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'replayed': 0, 'synthetic': 0, 'errors': 0, 'rate_limited': 0, 'expired': 0}
+        self.exchanges = self._load(recording) if recording else {}
+        self.server = None
+
+    @staticmethod
+    def _load(path):
+        """读取录制文件；同一请求录到多次时优先保留成功的那次"""
+        exchanges = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                previous = exchanges.get(entry['key'])
+                if previous is None or entry['status'] == 200 or previous['status'] != 200:
+                    exchanges[entry['key']] = entry
+        return exchanges
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self, host='127.0.0.1', port=0):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                credential = self.headers.get('Cookie') or self.headers.get('Authorization', '')
+                status, headers, payload = stand_in.respond(self.command, self.path, body, credential)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def respond(self, method, path, body, credential=''):
+        """返回(状态码, 响应头, 响应体)"""
+        self._count('requests')
+        with self.lock:
+            delay = self.latency_ms + self.random.uniform(0, self.jitter_ms)
+            inject_error = self.random.random() < self.error_rate
+            bucket = None
+            if self.rate_limit:
+                bucket = self.buckets.get(credential)
+                if bucket is None:
+                    bucket = self.buckets[credential] = TokenBucket(self.rate_limit)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        if credential in self.expired_credentials:
+            self._count('expired')
+            return 200, {'Content-Type': 'application/json'}, b'{"ok": -100, "url": "https://passport.weibo.com/"}'
+        if bucket is not None:
+            wait = bucket.try_acquire()
+            if wait:
+                self._count('rate_limited')
+                return 429, {'Retry-After': str(max(1, math.ceil(wait)))}, b'rate limited'
+        if inject_error:
+            self._count('errors')
+            return 503, {}, b'injected error'
+
+        entry = self.exchanges.get(exchange_key(method, path, body))
+        if entry is not None:
+            self._count('replayed')
+            return entry['status'], entry.get('headers', {}), entry['body'].encode('utf-8')
+
+        data = self._synthesize(method, path, body)
+        if data is None:
+            return 404, {}, b'not recorded'
+        self._count('synthetic')
+        return 200, {'Content-Type': 'application/json'}, json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def _synthesize(self, method, path, body):
+        parsed = urlparse(path)
+        query = dict(parse_qsl(parsed.query))
+        if method == 'POST' and parsed.path.endswith('/chat/completions'):
+            return self._synthesize_completion(body)
+        if parsed.path.endswith('/ajax/statuses/show'):
+            mid = query.get('id', '')
+            return {
+                'id': mid, 'text_raw': f'替身微博 {mid}', 'created_at': 'Thu Oct 15 10:00:00 +0800 2026',
+                'user': {'screen_name': 'stand_in'}, 'reposts_count': 0,
+                'comments_count': self.synthetic_pages * self.page_size, 'attitudes_count': 0
+            }
+        if parsed.path.endswith('/ajax/statuses/buildComments'):
+            page = int(query.get('max_id') or 0)
+            if query.get('fetch_level', '0') != '0' or page >= self.synthetic_pages:
+                return {'data': [], 'max_id': 0}
+            comments = []
+            for i in range(self.page_size):
+                number = page * self.page_size + i
+                comments.append({
+                    'id': f"{query.get('id', '')}{number:06d}",
+                    'text_raw': f'替身评论 {number}',
+                    'created_at': 'Thu Oct 15 10:00:00 +0800 2026',
+                    'user': {'screen_name': f'user{number % 97}'},
+                    'like_counts': number % 7
+                })
+            return {'data': comments, 'max_id': page + 1 if page + 1 < self.synthetic_pages else 0}
+        return None
+
+    @staticmethod
+    def _synthesize_completion(body):
+        try:
+            prompt = json.loads(body)['messages'][-1]['content']
+        except (ValueError, KeyError, IndexError, TypeError):
+            prompt = ''
+        match = re.search(r'以下共(\d+)条评论', prompt)
+
+        def label(text):
+            return int(hashlib.md5(text.encode('utf-8')).hexdigest(), 16) % 3
+
+        if match:
+            items = re.findall(r'^(\d+)\. (.*)$', prompt, re.MULTILINE)
+            content = '\n'.join(f'{number}:{label(text)}' for number, text in items)
+        else:
+            content = str(label(prompt))
+        return {
+            'choices': [{'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': len(prompt), 'completion_tokens': len(content)}
+        }
+
+
+def benchmark(stand_in, pages, credentials=1, **analyzer_overrides):
+    """在替身服务器上完整跑一遍爬取和分析，输出吞吐"""
+    from config import ANALYZER_CONFIG, CRAWLER_CONFIG
+    from sentiment_analyzer import SentimentAnalyzer
+    from weibo_crawler import WeiboCrawler
+
+    output_dir = tempfile.mkdtemp(prefix='stand_in_')
+    # 断点也写到临时目录，中断的压测不会在真实的断点目录留下替身微博
+    CRAWLER_CONFIG.update(base_url=stand_in.url, output_dir=os.path.join(output_dir, 'raw'),
+                          checkpoint_dir=os.path.join(output_dir, 'checkpoints'),
+                          record_dir='', initial_delay=0.0, min_delay=0.0)
+    ANALYZER_CONFIG.update(api_url=stand_in.url + '/chat/completions',
+                           output_dir=os.path.join(output_dir, 'analyzed'),
+                           record_dir='', cache_enabled=False, **analyzer_overrides)
+
+    crawler = WeiboCrawler()
+    crawler.set_headers('stand-in', 'stand-in-1', 'stand-in')
+    for number in range(2, credentials + 1):
+        crawler.add_credentials('stand-in', f'stand-in-{number}', 'stand-in')
+    start = time.perf_counter()
+    comments_file = crawler.crawl_comments('5000000000000000')
+    crawl_seconds = time.perf_counter() - start
+
+    analyzer = SentimentAnalyzer()
+    analyzer.set_api_key('stand-in')
+    start = time.perf_counter()
+    analyzer.analyze_comments(comments_file)
+    analyze_seconds = time.perf_counter() - start
+
+    count = crawler.tasks['5000000000000000'].comment_count
+    print(f"爬取 {pages} 页 {count} 条: {crawl_seconds:.2f} 秒（{count / crawl_seconds:.1f} 条/秒）")
+    print(f"分析 {count} 条: {analyze_seconds:.2f} 秒（{count / analyze_seconds:.1f} 条/秒）")
+    print(crawler.credentials.describe())
+    print(f"替身服务器: {stand_in.stats}")
+    print(f"输出目录: {output_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='微博/DeepSeek接口的本地替身服务器（回放录制或生成假数据）')
+    parser.add_argument('command', choices=['serve', 'bench'],
+                        help='serve: 启动替身服务器；bench: 在替身上跑一遍爬取+分析并输出吞吐')
+    parser.add_argument('--recording', help='录制文件（record_dir 下的 exchanges.jsonl）')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='每个请求的固定延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='在固定延迟上叠加的随机延迟上限')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='随机返回503的比例')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='每组凭据每秒最多处理的请求数，超出返回429')
+    parser.add_argument('--pages', type=int, default=10, help='没有录制时每条微博生成的评论页数')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子，固定后延迟和错误可复现')
+    parser.add_argument('--batch-size', type=int, default=None, help='bench时覆盖ANALYZER_CONFIG的batch_size')
+    parser.add_argument('--workers', type=int, default=None, help='bench时覆盖ANALYZER_CONFIG的max_workers')
+    parser.add_argument('--credentials', type=int, default=1, help='bench时爬虫轮换使用的凭据组数')
+    parser.add_argument('--expired', nargs='*', default=[], help='这些Cookie返回未登录，用于测试凭据失效')
+    args = parser.parse_args()
+
+    stand_in = StandInServer(
+        recording=args.recording,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        synthetic_pages=args.pages,
+        seed=args.seed,
+        expired_credentials=args.expired
+    )
+
+    if args.command == 'bench':
+        stand_in.start()
+        overrides = {}
+        if args.batch_size:
+            overrides['batch_size'] = args.batch_size
+        if args.workers:
+            overrides['max_workers'] = args.workers
+        try:
+            benchmark(stand_in, args.pages, args.credentials, **overrides)
+        finally:
+            stand_in.shutdown()
+        return
+
+    stand_in.start(port=args.port)
+    print(f"替身服务器已启动: {stand_in.url}（已加载 {len(stand_in.exchanges)} 条录制）")
+    print(f"  CRAWLER_CONFIG['base_url'] = '{stand_in.url}'")
+    print(f"  ANALYZER_CONFIG['api_url'] = '{stand_in.url}/chat/completions'")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\n{stand_in.stats}")
+        stand_in.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+from collections import Counter, defaultdict
+from comment_dedup import EMOTICON_PATTERN, normalize_comment
+from config import ANALYZER_CONFIG
+
+
+# 情感词典：只收录语义明确、很少被反讽使用的词
+POSITIVE_WORDS = [
+    '支持', '点赞', '赞', '加油', '好棒', '太棒', '厉害', '优秀', '感动', '喜欢', '爱了',
+    '哈哈', '好看', '可爱', '开心', '期待', '恭喜', '谢谢', '感谢', '牛', '绝了', '好评',
+    '顶', '必须支持', '冲', '棒'
+]
+NEGATIVE_WORDS = [
+    '垃圾', '恶心', '滚', '傻', '离谱', '无语', '失望', '骗子', '可耻', '讨厌', '差评',
+    '丢人', '呵呵', '脑残', '吐了', '退钱', '气死', '愤怒', '抵制', '骗', '烂', '坑'
+]
+POSITIVE_EMOTICONS = [
+    '[赞]', '[心]', '[鼓掌]', '[哈哈]', '[笑cry]', '[给力]', '[good]', '[爱你]', '[太开心]',
+    '[可爱]', '[偷笑]', '[加油]', '[抱抱]', '[送花花]'
+]
+NEGATIVE_EMOTICONS = [
+    '[怒]', '[怒骂]', '[吐]', '[鄙视]', '[衰]', '[伤心]', '[生病]', '[抓狂]', '[哼]',
+    '[白眼]', '[汗]', '[裂开]', '[微笑]', '[拜拜]'
+]
+# 出现否定或转折时词典无法判断，直接交给大模型
+NEGATION_MARKERS = ['不', '没', '别', '非', '无', '但', '却', '可是', '难道', '?', '？']
+
+
+class LexiconClassifier:
+    """基于情感词典的本地分类器
+
+    置信度为命中词覆盖评论的比例；正负词同时出现、或带否定/转折时置信度为0。
+    """
+
+    def __init__(self):
+        # 长词优先匹配，避免"必须支持"被拆成"支持"
+        self.words = sorted(
+            [(w, 0) for w in POSITIVE_WORDS] + [(w, 2) for w in NEGATIVE_WORDS],
+            key=lambda item: -len(item[0])
+        )
+        self.emoticons = dict(
+            [(e, 0) for e in POSITIVE_EMOTICONS] + [(e, 2) for e in NEGATIVE_EMOTICONS]
+        )
+
+    def _match(self, text):
+        """返回(命中的情感值集合, 命中的字数, 总字数)"""
+        emoticons = EMOTICON_PATTERN.findall(text)
+        body = normalize_comment(EMOTICON_PATTERN.sub('', text))
+        total_units = len(body) + len(emoticons)
+
+        polarities = set()
+        matched_units = 0
+        for emoticon in emoticons:
+            if emoticon in self.emoticons:
+                polarities.add(self.emoticons[emoticon])
+                matched_units += 1
+
+        remaining = body
+        for word, polarity in self.words:
+            count = remaining.count(word)
+            if count:
+                polarities.add(polarity)
+                matched_units += count * len(word)
+                remaining = remaining.replace(word, '')
+        return polarities, matched_units, total_units
+
+    def vetoes(self, text):
+        """带否定/转折，或正负词同时出现：本地模型都不可信，必须交给大模型"""
+        text = str(text)
+        if any(marker in text for marker in NEGATION_MARKERS):
+            return True
+        return len(self._match(text)[0]) > 1
+
+    def predict(self, text):
+        """返回(情感值, 置信度)"""
+        text = str(text)
+        if any(marker in text for marker in NEGATION_MARKERS):
+            return 1, 0.0
+
+        polarities, matched_units, total_units = self._match(text)
+        if total_units == 0 or len(polarities) != 1:
+            return 1, 0.0
+        return polarities.pop(), matched_units / total_units
+
+
+class NaiveBayesClassifier:
+    """字符一元/二元语法的多项式朴素贝叶斯，用缓存中的大模型标签训练"""
+
+    # 校准时尝试的温度
+    TEMPERATURES = [1, 1.5, 2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64]
+
+    def __init__(self):
+        self.class_counts = Counter()
+        self.feature_counts = defaultdict(Counter)
+        self.feature_totals = Counter()
+        self.vocabulary = set()
+        # 朴素贝叶斯把重叠的一元/二元特征当作独立证据，原始后验几乎总是接近1；
+        # 用留出集拟合的温度缩放对数概率，未校准时按特征数缩放（取每个特征的平均证据）
+        self.temperature = None
+
+    @staticmethod
+    def _features(text):
+        text = normalize_comment(text)
+        return list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+
+    def train(self, texts, labels):
+        for text, label in zip(texts, labels):
+            label = int(label)
+            self.class_counts[label] += 1
+            features = self._features(text)
+            self.feature_counts[label].update(features)
+            self.feature_totals[label] += len(features)
+            self.vocabulary.update(features)
+
+    def _scores(self, text):
+        """各情感的对数概率（未归一化）与特征数"""
+        features = self._features(text)
+        total_docs = sum(self.class_counts.values())
+        vocab_size = len(self.vocabulary) + 1
+        scores = {}
+        for label, doc_count in self.class_counts.items():
+            score = math.log(doc_count / total_docs)
+            denominator = self.feature_totals[label] + vocab_size
+            counts = self.feature_counts[label]
+            for feature in features:
+                score += math.log((counts.get(feature, 0) + 1) / denominator)
+            scores[label] = score
+        return scores, len(features)
+
+    @staticmethod
+    def _posterior(scores, temperature):
+        """按温度缩放对数概率后用 log-sum-exp 归一化，返回各情感的概率"""
+        top = max(scores.values())
+        weights = {label: math.exp((score - top) / temperature) for label, score in scores.items()}
+        norm = sum(weights.values())
+        return {label: weight / norm for label, weight in weights.items()}
+
+    def predict(self, text):
+        """返回(情感值, 校准后的概率)"""
+        if not self.class_counts:
+            return 1, 0.0
+        scores, feature_count = self._scores(text)
+        probabilities = self._posterior(scores, self.temperature or max(1, feature_count))
+        best = max(probabilities, key=probabilities.get)
+        return best, probabilities[best]
+
+    def calibrate(self, texts, labels):
+        """在留出集上选出使对数损失最小的温度，返回该温度"""
+        samples = [(self._scores(text)[0], int(label)) for text, label in zip(texts, labels)]
+        samples = [(scores, label) for scores, label in samples if label in scores]
+        if not samples:
+            return self.temperature
+
+        def log_loss(temperature):
+            return -sum(
+                math.log(max(self._posterior(scores, temperature)[label], 1e-12))
+                for scores, label in samples
+            )
+
+        self.temperature = min(self.TEMPERATURES, key=log_loss)
+        return self.temperature
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'class_counts': {str(k): v for k, v in self.class_counts.items()},
+                'feature_counts': {str(k): dict(v) for k, v in self.feature_counts.items()},
+                'temperature': self.temperature
+            }, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        model = cls()
+        model.class_counts = Counter({int(k): v for k, v in data['class_counts'].items()})
+        model.temperature = data.get('temperature')
+        for label, counts in data['feature_counts'].items():
+            model.feature_counts[int(label)] = Counter(counts)
+            model.feature_totals[int(label)] = sum(counts.values())
+            model.vocabulary.update(counts)
+        return model
+
+
+class LocalClassifier:
+    """级联的第一级：词典 + 可选的朴素贝叶斯模型，都在本地CPU上运行
+
+    词典发现否定、转折或正负词同时出现时直接否决（置信度0），朴素贝叶斯不能推翻；
+    两个模型都有把握但结论不同时置信度也记为0，交给大模型判断。
+    """
+
+    def __init__(self, model_path=None):
+        self.lexicon = LexiconClassifier()
+        self.bayes = None
+        if model_path and os.path.exists(model_path):
+            try:
+                self.bayes = NaiveBayesClassifier.load(model_path)
+            except Exception as e:
+                print(f"加载本地模型失败，仅使用情感词典: {str(e)}")
+
+    def predict(self, text, threshold=0.0):
+        """返回(情感值, 置信度)"""
+        if self.lexicon.vetoes(text):
+            return 1, 0.0
+        label, confidence = self.lexicon.predict(text)
+        if self.bayes is None:
+            return label, confidence
+
+        bayes_label, bayes_confidence = self.bayes.predict(text)
+        if confidence >= threshold and bayes_confidence >= threshold and label != bayes_label:
+            return 1, 0.0
+        if bayes_confidence > confidence:
+            return bayes_label, bayes_confidence
+        return label, confidence
+
+
+def evaluate(classifier, texts, labels, threshold):
+    """在留出集上评估级联效果
+
+    Returns:
+        dict: escalation_rate 为需要升级到大模型的比例，
+              agreement 为本地直接判断的部分与大模型标签一致的比例
+    """
+    local_total = 0
+    agreed = 0
+    for text, label in zip(texts, labels):
+        predicted, confidence = classifier.predict(text, threshold)
+        if confidence >= threshold:
+            local_total += 1
+            agreed += int(predicted == int(label))
+    total = len(texts)
+    return {
+        'samples': total,
+        'escalation_rate': (total - local_total) / total if total else 0.0,
+        'agreement': agreed / local_total if local_total else 0.0
+    }
+
+
+def _is_held_out(text, ratio):
+    """按文本哈希稳定地划分留出集"""
+    digest = hashlib.md5(text.encode('utf-8')).digest()
+    return digest[0] < ratio * 256
+
+
+def main():
+    from sentiment_cache import SentimentCache
+
+    parser = argparse.ArgumentParser(description='用缓存的大模型标签训练并评估本地分类器')
+    parser.add_argument('--cache', default=ANALYZER_CONFIG['cache_path'], help='情感缓存路径')
+    parser.add_argument('--output', default=ANALYZER_CONFIG['local_model_path'], help='模型保存路径')
+    parser.add_argument('--threshold', type=float, default=ANALYZER_CONFIG['cascade_threshold'])
+    parser.add_argument('--holdout', type=float, default=0.2, help='留出集比例')
+    args = parser.parse_args()
+
+    rows = SentimentCache(args.cache).labeled_texts()
+    if not rows:
+        print("缓存中没有可用于训练的标签")
+        return
+
+    train = [(t, l) for t, l in rows if not _is_held_out(t, args.holdout)]
+    held_out = [(t, l) for t, l in rows if _is_held_out(t, args.holdout)]
+
+    bayes = NaiveBayesClassifier()
+    bayes.train([t for t, _ in train], [l for _, l in train])
+    if held_out:
+        temperature = bayes.calibrate([t for t, _ in held_out], [l for _, l in held_out])
+        print(f"留出集校准温度: {temperature}")
+    bayes.save(args.output)
+    print(f"训练样本 {len(train)} 条，模型已保存至: {args.output}")
+
+    if held_out:
+        classifier = LocalClassifier(args.output)
+        report = evaluate(classifier, [t for t, _ in held_out], [l for _, l in held_out], args.threshold)
+        print(f"留出集 {report['samples']} 条: 升级比例 {report['escalation_rate']:.1%}，"
+              f"本地判断与大模型一致率 {report['agreement']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,13 +2,20 @@ import os
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog  # 合并导入
 import threading
-import pandas as pd
 from PIL import Image, ImageTk
 from weibo_crawler import WeiboCrawler
 from sentiment_analyzer import SentimentAnalyzer
 from chart_maker import ChartMaker
+from comment_store import read_comments
+from pipeline import CrawlAnalyzePipeline
 from config import UI_CONFIG, ERROR_MESSAGES  # 确保从config导入
 
+# 评论列表显示用到的列
+DISPLAY_COLUMNS = ['comment_id', 'content', 'created_at', 'user_name', 'like_count', 'sentiment']
+
+# 词云可选的评论范围
+WORDCLOUD_CHOICES = {'全部评论': None, '积极评论': 0, '中性评论': 1, '消极评论': 2}
+
 class MainWindow:
     def __init__(self):
         self.root = tk.Tk()
@@ -20,6 +27,8 @@ class MainWindow:
         self.crawler = WeiboCrawler()
         self.analyzer = SentimentAnalyzer()
         self.chart_maker = ChartMaker()
+        # 提前启动绘图进程，第一次生成图表时不用等待
+        self.chart_maker.renderer.warm_up()
         
         # 初始化状态变量
         self.is_crawling = False
@@ -119,6 +128,7 @@ class MainWindow:
         ttk.Button(control_frame, text="开始分析", command=self.start_analysis).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="停止分析", command=self.stop_analysis).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="继续分析", command=self.resume_analysis).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="边爬边分析", command=self.start_pipeline).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="积极评论", command=lambda: self.filter_comments(0)).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="中性评论", command=lambda: self.filter_comments(1)).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="消极评论", command=lambda: self.filter_comments(2)).pack(side=tk.LEFT, padx=5)
@@ -147,6 +157,15 @@ class MainWindow:
         # 添加按钮到右侧控制区域
         ttk.Button(visual_control_frame, text="生成统计饼图", command=self.generate_pie_chart).pack(side=tk.LEFT, padx=5)
         ttk.Button(visual_control_frame, text="生成词云图", command=self.generate_wordcloud).pack(side=tk.LEFT, padx=5)
+        ttk.Button(visual_control_frame, text="生成趋势图", command=self.generate_trend_chart).pack(side=tk.LEFT, padx=5)
+        # 切换词云的情感范围，词频已统计好，只需重新绘制
+        self.wordcloud_choice = ttk.Combobox(
+            visual_control_frame, values=list(WORDCLOUD_CHOICES), state='readonly', width=8
+        )
+        self.wordcloud_choice.current(0)
+        self.wordcloud_choice.bind('<<ComboboxSelected>>', lambda event: self.generate_wordcloud())
+        self.wordcloud_choice.pack(side=tk.LEFT, padx=5)
+        ttk.Button(visual_control_frame, text="导出高清图", command=self.export_charts).pack(side=tk.LEFT, padx=5)
         ttk.Button(visual_control_frame, text="清空图表", command=self.clear_all).pack(side=tk.LEFT, padx=5)
         
         # 右侧面板中添加垂直PanedWindow
@@ -158,10 +177,10 @@ class MainWindow:
         right_paned.add(pie_frame, weight=1)
         
         # 创建一个容器框架来居中显示饼图
-        pie_container = ttk.Frame(pie_frame)
-        pie_container.pack(fill=tk.BOTH, expand=True)
+        self.pie_container = ttk.Frame(pie_frame)
+        self.pie_container.pack(fill=tk.BOTH, expand=True)
         
-        self.pie_label = ttk.Label(pie_container)
+        self.pie_label = ttk.Label(self.pie_container)
         self.pie_label.pack(expand=True)  # 使用expand=True来居中显示
         
         # 下方词云图展示区域
@@ -201,11 +220,7 @@ class MainWindow:
                     return
                 
                 # 设置爬虫参数
-                self.crawler.set_headers(
-                    user_agent=user_agent,
-                    cookie=cookie,
-                    referer=referer
-                )
+                self._set_crawler_headers(user_agent, cookie, referer)
                 
                 # 如果提供了微博ID，使用它来构建URL
                 if weibo_id:
@@ -217,6 +232,13 @@ class MainWindow:
             except Exception as e:
                 messagebox.showerror("错误", str(e))
 
+    def _set_crawler_headers(self, user_agent, cookie, referer):
+        """设置爬虫凭据；Cookie框中每行填一个Cookie时轮换使用，提高持续爬取速度"""
+        cookies = [line.strip() for line in cookie.splitlines() if line.strip()] or ['']
+        self.crawler.set_headers(user_agent=user_agent, cookie=cookies[0], referer=referer)
+        for extra in cookies[1:]:
+            self.crawler.add_credentials(user_agent, extra, referer)
+
     def stop_crawl(self):
         """停止爬取"""
         if self.is_crawling:
@@ -238,12 +260,23 @@ class MainWindow:
         try:
             self.update_status("继续爬取评论...")
             output_file = self.crawler.resume()
+            if output_file is None:
+                # 本次运行中没有可继续的任务（程序重启过），从检查点继续
+                url = self.url_text.get("1.0", tk.END).strip()
+                if not len(self.crawler.credentials):
+                    self._set_crawler_headers(
+                        self.user_agent_text.get("1.0", tk.END).strip(),
+                        self.cookie_text.get("1.0", tk.END).strip(),
+                        self.referer_text.get("1.0", tk.END).strip()
+                    )
+                results = self.crawler.resume_from_checkpoint([url] if url else None)
+                output_file = next((f for f in results.values() if f), None)
             if output_file:
                 self.last_crawl_file = output_file
                 self.show_message("完成", f"评论已保存至: {output_file}")
                 
                 # 显示评论内容
-                df = pd.read_csv(output_file)
+                df = read_comments(output_file)
                 self.result_text.delete(1.0, tk.END)
                 for _, row in df.iterrows():
                     comment_info = (
@@ -321,15 +354,18 @@ class MainWindow:
                 self.root.update()
                 
             self.analyzer.progress_callback = progress_callback
+            self.analyzer.throughput_callback = self._show_analysis_speed
             
             # 继续分析
             output_file = self.analyzer.resume()
+            if self.analyzer.last_error:
+                self.show_message("错误", f"API调用失败，分析已停止: {self.analyzer.last_error}")
             if output_file and os.path.exists(output_file):
                 self.last_analysis_file = output_file
                 print(f"分析结果文件保存在: {output_file}")
                 
                 # 显示分析结果
-                df = pd.read_csv(output_file)
+                df = read_comments(output_file)
                 if df.empty:
                     raise Exception("分析结果为空")
                 
@@ -376,43 +412,138 @@ class MainWindow:
             self.is_analyzing = False
             self.analyzer.is_running = False  # 确保分析器停止
 
+    def _when_done(self, future, on_done, action):
+        """在界面线程中轮询后台绘图任务，完成后调用on_done(图片路径)"""
+        if not future.done():
+            self.root.after(50, self._when_done, future, on_done, action)
+            return
+        try:
+            on_done(future.result())
+        except Exception as e:
+            print(f"{action}错误: {str(e)}")
+            self.show_message("错误", str(e))
+            self.update_status(f"{action}失败")
+
+    @staticmethod
+    def _display_size(widget):
+        """图表显示区域的像素大小，预览图按此绘制"""
+        widget.update_idletasks()
+        return max(widget.winfo_width(), 100), max(widget.winfo_height(), 100)
+
     def generate_pie_chart(self):
-        """生成饼图"""
+        """生成饼图：在后台按显示区域大小绘制预览，界面不会卡住"""
         try:
-            if not hasattr(self, 'last_analysis_file'):
-                self.show_message("错误", "请先进行情感分析")
+            if not self.last_analysis_file:
+                self.show_message("错误", ERROR_MESSAGES['no_analysis'])
                 return
-                
-            chart_file = self.chart_maker.create_pie_chart(self.last_analysis_file)
-            if chart_file:
-                self.current_pie_file = chart_file
-                self._update_pie_display()
-                self.update_status("饼图生成完成")
-                
+
+            future = self.chart_maker.preview_pie_chart(
+                self.last_analysis_file, self._display_size(self.pie_container)
+            )
+            if future is None:
+                self.update_status("没有可绘制的情感数据")
+                return
+            self.update_status("正在生成饼图...")
+            self._when_done(future, self._show_pie_chart, "生成饼图")
+
         except Exception as e:
             print(f"生成饼图错误: {str(e)}")
             self.show_message("错误", str(e))
             self.update_status("饼图生成失败")
 
+    def _show_pie_chart(self, chart_file):
+        self.current_pie_file = chart_file
+        self._update_pie_display()
+        self.update_status("饼图生成完成")
+
+    def generate_trend_chart(self):
+        """生成情感趋势图：按评论时间分桶统计，在饼图区域显示"""
+        try:
+            if not self.last_analysis_file:
+                self.show_message("错误", ERROR_MESSAGES['no_analysis'])
+                return
+
+            future = self.chart_maker.preview_trend_chart(
+                self.last_analysis_file, self._display_size(self.pie_container)
+            )
+            self.update_status("正在生成趋势图...")
+            self._when_done(future, self._show_trend_chart, "生成趋势图")
+
+        except Exception as e:
+            print(f"生成趋势图错误: {str(e)}")
+            self.show_message("错误", str(e))
+            self.update_status("趋势图生成失败")
+
+    def _show_trend_chart(self, chart_file):
+        if chart_file is None:
+            self.update_status("没有可绘制的评论时间数据")
+            return
+        self.current_pie_file = chart_file
+        self._update_pie_display()
+        self.update_status("趋势图生成完成")
+
     def generate_wordcloud(self):
-        """生成词云图"""
+        """生成词云图：在后台按显示区域大小绘制预览"""
         try:
-            chart_file = self.chart_maker.create_wordcloud(self.last_analysis_file)
-            if chart_file:
-                self.root.update()
-                frame_width = self.wordcloud_label.winfo_width()
-                frame_height = self.wordcloud_label.winfo_height()
-                
-                if frame_width > 0 and frame_height > 0:
-                    self.current_wordcloud_file = chart_file  # 保存当前文件路径
-                    self._update_wordcloud_display()  # 更新显示
-                    self.update_status("词云图生成完成")
-                    
+            if not self.last_analysis_file:
+                self.show_message("错误", ERROR_MESSAGES['no_analysis'])
+                return
+
+            sentiment = WORDCLOUD_CHOICES[self.wordcloud_choice.get()]
+            future = self.chart_maker.preview_wordcloud(
+                self.last_analysis_file, self._display_size(self.wordcloud_label), sentiment
+            )
+            self.update_status("正在生成词云图...")
+            self._when_done(future, self._show_wordcloud, "生成词云图")
+
         except Exception as e:
             print(f"生成词云图错误: {str(e)}")
             self.show_message("错误", str(e))
             self.update_status("词云图生成失败")
 
+    def _show_wordcloud(self, chart_file):
+        self.current_wordcloud_file = chart_file  # 保存当前文件路径
+        self._update_wordcloud_display()  # 更新显示
+        self.update_status("词云图生成完成")
+
+    def export_charts(self):
+        """把饼图、趋势图和当前选择的词云按300dpi导出到选定的目录"""
+        try:
+            if not self.last_analysis_file:
+                self.show_message("错误", ERROR_MESSAGES['no_analysis'])
+                return
+            directory = filedialog.askdirectory(title="选择导出目录")
+            if not directory:
+                return
+
+            choice = self.wordcloud_choice.get()
+            futures = [
+                self.chart_maker.export_pie_chart(
+                    self.last_analysis_file, os.path.join(directory, 'sentiment_pie.png')
+                ),
+                self.chart_maker.export_trend_chart(
+                    self.last_analysis_file, os.path.join(directory, 'sentiment_trend.png')
+                ),
+                self.chart_maker.export_wordcloud(
+                    self.last_analysis_file, os.path.join(directory, f'wordcloud_{choice}.png'),
+                    WORDCLOUD_CHOICES[choice]
+                )
+            ]
+            self.update_status("正在导出高清图...")
+            for future in futures:
+                if future is not None:
+                    self._when_done(future, self._show_exported, "导出高清图")
+
+        except Exception as e:
+            print(f"导出高清图错误: {str(e)}")
+            self.show_message("错误", str(e))
+            self.update_status("导出高清图失败")
+
+    def _show_exported(self, chart_file):
+        # 没有评论时间数据时趋势图不导出
+        if chart_file is not None:
+            self.update_status(f"已导出: {chart_file}")
+
     def _update_pie_display(self, event=None):
         """更新饼图显示"""
         if hasattr(self, 'current_pie_file'):
@@ -504,7 +635,7 @@ class MainWindow:
                     return
                 
             self.update_status(f"正在筛选{self.chart_maker.labels[sentiment]}评论...")
-            df = pd.read_csv(self.last_analysis_file)
+            df = read_comments(self.last_analysis_file, columns=DISPLAY_COLUMNS)
             
             # 确保没有重复的评论，并且保留最后一次分析的结果
             df = df.drop_duplicates(subset=['comment_id', 'content'], keep='last')
@@ -558,7 +689,7 @@ class MainWindow:
                 self.show_message("完成", f"评论已保存至: {output_file}")
                 
                 # 显示评论内容(增加更多信息)
-                df = pd.read_csv(output_file)
+                df = read_comments(output_file)
                 self.result_text.delete(1.0, tk.END)
                 for _, row in df.iterrows():
                     comment_info = (
@@ -579,6 +710,65 @@ class MainWindow:
         finally:
             self.is_crawling = False
 
+    def start_pipeline(self):
+        """边爬边分析：爬到的每页评论立即交给分析线程"""
+        if self.is_crawling or self.is_analyzing:
+            return
+        try:
+            url = self.url_text.get("1.0", tk.END).strip()
+            weibo_id = self.weibo_id_entry.get().strip()
+            user_agent = self.user_agent_text.get("1.0", tk.END).strip()
+            referer = self.referer_text.get("1.0", tk.END).strip()
+            cookie = self.cookie_text.get("1.0", tk.END).strip()
+            api_key = self.api_key_entry.get().strip()
+            
+            if not url and not weibo_id:
+                messagebox.showerror("错误", "请输入URL或微博ID")
+                return
+            if not all([user_agent, referer, cookie]):
+                messagebox.showerror("错误", "请填写完整的爬取参数")
+                return
+            if not api_key:
+                messagebox.showerror("错误", "请输入API Key")
+                return
+            
+            self._set_crawler_headers(user_agent, cookie, referer)
+            self.analyzer.set_api_key(api_key)
+            if weibo_id:
+                url = f"https://weibo.com/ajax/statuses/show?id={weibo_id}"
+            
+            self.is_crawling = True
+            self.is_analyzing = True
+            threading.Thread(target=self._pipeline_thread, args=(url,)).start()
+        except Exception as e:
+            messagebox.showerror("错误", str(e))
+    
+    def _pipeline_thread(self, url):
+        """边爬边分析线程"""
+        try:
+            self.update_status("正在边爬边分析...")
+            self.result_text.delete(1.0, tk.END)
+            self.progress_var.set(0)
+            self.crawler.progress_callback = lambda count: self.update_status(f"正在边爬边分析... 已爬取 {count} 条")
+            self.analyzer.progress_callback = None
+            self.analyzer.throughput_callback = None
+            
+            comments_file, output_file = CrawlAnalyzePipeline(self.crawler, self.analyzer).run(url)
+            if comments_file:
+                self.last_crawl_file = comments_file
+            if self.analyzer.last_error:
+                self.show_message("错误", f"API调用失败，分析已停止: {self.analyzer.last_error}")
+            self._display_analysis_results(output_file)
+            
+        except Exception as e:
+            print(f"边爬边分析错误: {str(e)}")
+            self.show_message("错误", str(e))
+            self.update_status("分析失败")
+        finally:
+            self.is_crawling = False
+            self.is_analyzing = False
+            self.analyzer.is_running = False
+
     def _analysis_thread(self):
         """分析线程"""
         try:
@@ -611,53 +801,13 @@ class MainWindow:
                 self.root.update()
                 
             self.analyzer.progress_callback = progress_callback
+            self.analyzer.throughput_callback = self._show_analysis_speed
             
             # 开始分析
             output_file = self.analyzer.analyze_comments(self.last_crawl_file)
-            if output_file and os.path.exists(output_file):
-                self.last_analysis_file = output_file
-                print(f"分析结果文件保存在: {output_file}")
-                
-                # 显示分析结果
-                df = pd.read_csv(output_file)
-                if df.empty:
-                    raise Exception("分析结果为空")
-                
-                # 确保没有重复的评论，并且保留最后一次分析的结果
-                df = df.drop_duplicates(subset=['comment_id', 'content'], keep='last')
-                
-                # 统计各类情感数量
-                sentiment_counts = df['sentiment'].value_counts()
-                total = len(df)
-                
-                # 显示统计信息
-                self.result_text.delete(1.0, tk.END)  # 清空显示
-                self.result_text.insert(tk.END, "情感分析结果统计：\n")
-                self.result_text.insert(tk.END, "=" * 30 + "\n")
-                for sentiment, count in sentiment_counts.items():
-                    percentage = count / total * 100
-                    label = self.chart_maker.labels[sentiment]
-                    self.result_text.insert(tk.END, f"{label}: {count}条 ({percentage:.1f}%)\n")
-                self.result_text.insert(tk.END, "=" * 30 + "\n\n")
-                
-                # 显示详细结果
-                for _, row in df.iterrows():
-                    sentiment = self.chart_maker.labels[row['sentiment']]
-                    comment_info = (
-                        f"[{sentiment}]\n"
-                        f"用户: {row['user_name']}\n"
-                        f"时间: {row['created_at']}\n"
-                        f"点赞: {row['like_count']}\n"
-                        f"内容: {row['content']}\n"
-                        f"{'-'*50}\n"
-                    )
-                    self.result_text.insert(tk.END, comment_info)
-                    
-                self.update_status("分析完成")
-                self.show_message("完成", "情感分析已完成")
-                
-            else:
-                raise Exception("分析结果文件生成失败")
+            if self.analyzer.last_error:
+                self.show_message("错误", f"API调用失败，分析已停止: {self.analyzer.last_error}")
+            self._display_analysis_results(output_file)
                 
         except Exception as e:
             print(f"分析错误: {str(e)}")
@@ -667,6 +817,63 @@ class MainWindow:
             self.is_analyzing = False
             self.analyzer.is_running = False  # 确保分析器停止
 
+    def _display_analysis_results(self, output_file):
+        """显示分析结果的统计和逐条详情"""
+        if output_file and os.path.exists(output_file):
+            self.last_analysis_file = output_file
+            print(f"分析结果文件保存在: {output_file}")
+            
+            # 显示分析结果
+            df = read_comments(output_file)
+            if df.empty:
+                raise Exception("分析结果为空")
+            
+            # 确保没有重复的评论，并且保留最后一次分析的结果
+            df = df.drop_duplicates(subset=['comment_id', 'content'], keep='last')
+            
+            # 统计各类情感数量
+            sentiment_counts = df['sentiment'].value_counts()
+            total = len(df)
+            
+            # 显示统计信息
+            self.result_text.delete(1.0, tk.END)  # 清空显示
+            self.result_text.insert(tk.END, "情感分析结果统计：\n")
+            self.result_text.insert(tk.END, "=" * 30 + "\n")
+            for sentiment, count in sentiment_counts.items():
+                percentage = count / total * 100
+                label = self.chart_maker.labels[sentiment]
+                self.result_text.insert(tk.END, f"{label}: {count}条 ({percentage:.1f}%)\n")
+            self.result_text.insert(tk.END, "=" * 30 + "\n\n")
+            
+            # 显示详细结果
+            for _, row in df.iterrows():
+                sentiment = self.chart_maker.labels[row['sentiment']]
+                comment_info = (
+                    f"[{sentiment}]\n"
+                    f"用户: {row['user_name']}\n"
+                    f"时间: {row['created_at']}\n"
+                    f"点赞: {row['like_count']}\n"
+                    f"内容: {row['content']}\n"
+                    f"{'-'*50}\n"
+                )
+                self.result_text.insert(tk.END, comment_info)
+                
+            self.update_status("分析完成")
+            self.show_message("完成", "情感分析已完成")
+            
+        else:
+            raise Exception("分析结果文件生成失败")
+
+    def _show_analysis_speed(self, rate, eta):
+        """在状态栏显示分析速度和预计剩余时间"""
+        if eta is None:
+            self.status_var.set(f"正在进行情感分析... {rate:.1f} 条/秒")
+            return
+        minutes, seconds = divmod(int(eta), 60)
+        hours, minutes = divmod(minutes, 60)
+        remaining = f"{hours}小时{minutes}分" if hours else f"{minutes}分{seconds}秒"
+        self.status_var.set(f"正在进行情感分析... {rate:.1f} 条/秒，预计剩余 {remaining}")
+
     def show_original_comments(self):
         """显示原始评论"""
         try:
@@ -675,7 +882,7 @@ class MainWindow:
                 return
                 
             self.update_status("正在显示原始评论...")
-            df = pd.read_csv(self.last_crawl_file)
+            df = read_comments(self.last_crawl_file, columns=DISPLAY_COLUMNS)
             
             self.result_text.delete(1.0, tk.END)
             for _, row in df.iterrows():
@@ -721,6 +928,7 @@ def main():
         ensure_directories()
         app = MainWindow()
         app.root.mainloop()
+        app.chart_maker.shutdown()
     except Exception as e:
         print(f"程序运行错误: {str(e)}")
 
@@ -0,0 +1,96 @@
+import queue
+import threading
+from config import ANALYZER_CONFIG
+
+# 爬虫结束的标记
+_DONE = object()
+
+
+class CrawlAnalyzePipeline:
+    """边爬边分析：爬虫每写完一页就放入有界队列，分析线程同时从队列取评论分类
+
+    队列满时爬虫线程阻塞，分析跟不上时爬取自动放慢（背压）；
+    总耗时约为 max(爬取, 分析)，而不是两者之和。
+    """
+
+    def __init__(self, crawler, analyzer, queue_size=None):
+        self.crawler = crawler
+        self.analyzer = analyzer
+        self.queue = queue.Queue(maxsize=max(1, queue_size or ANALYZER_CONFIG.get('pipeline_queue_size', 10)))
+        self.closed = threading.Event()
+        self.comments_file = None
+        self.crawl_error = None
+
+    def _put(self, item):
+        """放入队列；分析已结束时不再等待，避免爬虫线程永远阻塞"""
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _on_page(self, task, rows):
+        if self.analyzer.post_content is None and task.original_post:
+            self.analyzer.post_content = task.original_post.get('content') or None
+        self._put((task.output_file, rows))
+
+    def _crawl(self, url):
+        try:
+            self.comments_file = self.crawler.crawl_comments(url)
+        except Exception as e:
+            self.crawl_error = e
+            print(f"爬取失败: {str(e)}")
+        finally:
+            self._put(_DONE)
+
+    def _chunks(self):
+        """每次至少等到一页，再把队列里已经到达的页一起取出，合并成一批交给分析"""
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                return
+            comments_file, rows = item
+            rows = list(rows)
+            done = False
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    done = True
+                    break
+                rows.extend(item[1])
+            yield comments_file, rows
+            if done:
+                return
+
+    def run(self, url):
+        """爬取url的评论并同时分析
+
+        Returns:
+            (评论文件路径, 分析结果文件路径)
+        """
+        self.analyzer.is_running = True
+        self.analyzer.post_content = None
+        previous_callback = self.crawler.page_callback
+        self.crawler.page_callback = self._on_page
+        crawl_thread = threading.Thread(target=self._crawl, args=(url,), daemon=True)
+        crawl_thread.start()
+        try:
+            output_file = self.analyzer.analyze_stream(self._chunks())
+        finally:
+            # 分析提前结束（停止或出错）时一并停止爬虫
+            self.closed.set()
+            if crawl_thread.is_alive():
+                self.crawler.stop()
+            crawl_thread.join()
+            self.crawler.page_callback = previous_callback
+        return self.comments_file, output_file
+
+    def stop(self):
+        """同时停止爬取和分析"""
+        self.crawler.stop()
+        self.analyzer.stop()
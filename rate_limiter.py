@@ -0,0 +1,105 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶：按固定速率补充令牌，令牌不足时阻塞等待"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(self.rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        """根据流逝的时间补充令牌"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, amount=1):
+        """取走amount个令牌，返回实际等待的秒数
+
+        令牌不足时先记账（允许为负）再在锁外等待，
+        这样多个线程按到达顺序排队，互不饿死。
+        """
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self, amount=1):
+        """不等待：令牌足够时取走并返回0，否则返回还需等待的秒数"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0
+            return (amount - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """组合限速器：每秒请求数 + 每分钟token数，任一项为空则不限制"""
+
+    def __init__(self, requests_per_second=None, tokens_per_minute=None):
+        self.request_bucket = TokenBucket(requests_per_second) if requests_per_second else None
+        self.token_bucket = (
+            TokenBucket(tokens_per_minute / 60.0, capacity=tokens_per_minute)
+            if tokens_per_minute else None
+        )
+
+    def acquire(self, tokens=0):
+        """为一次请求申请配额，返回等待的总秒数"""
+        waited = 0
+        if self.request_bucket:
+            waited += self.request_bucket.acquire(1)
+        if self.token_bucket and tokens:
+            waited += self.token_bucket.acquire(tokens)
+        return waited
+
+
+class AdaptiveThrottle:
+    """AIMD自适应请求间隔：响应正常时每次缩短step秒，出错时间隔乘以backoff
+
+    多个线程共用时按到达顺序预约发送时刻，相邻两次请求至少相隔当前间隔。
+    """
+
+    def __init__(self, initial_delay=1.0, min_delay=0.2, max_delay=30.0, step=0.1, backoff=2.0):
+        self.min_delay = float(min_delay)
+        self.max_delay = float(max(max_delay, min_delay))
+        self.delay = min(max(float(initial_delay), self.min_delay), self.max_delay)
+        self.step = float(step)
+        self.backoff = float(backoff)
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """预约下一个可发送的时刻，返回需要等待的秒数（不阻塞）"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_at)
+            self.next_at = start + self.delay
+            return start - now
+
+    def acquire(self):
+        """等到下一个可发送的时刻，返回实际等待的秒数"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record_success(self):
+        with self.lock:
+            self.delay = max(self.min_delay, self.delay - self.step)
+            return self.delay
+
+    def record_failure(self):
+        """出错后立即拉长间隔，已预约的下一次请求也一起推后"""
+        with self.lock:
+            self.delay = min(self.max_delay, self.delay * self.backoff)
+            self.next_at = max(self.next_at, time.monotonic() + self.delay)
+            return self.delay
@@ -0,0 +1,148 @@
+import csv
+import hashlib
+import json
+import os
+
+
+def _to_builtin(value):
+    """把numpy等标量转成可JSON序列化的Python对象"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _record_key(record):
+    """评论ID加内容的短哈希，导出时用来识别重复评论，不必在内存中保留评论全文"""
+    digest = hashlib.blake2b(str(record['content']).encode('utf-8'), digest_size=8).hexdigest()
+    return f"{record['comment_id']}_{digest}"
+
+
+class ResultJournal:
+    """分析结果的追加式日志（JSON Lines）
+
+    每条结果追加一行，攒够flush_every条后flush并fsync一次；
+    进程崩溃最多丢失最后一批，最后一行写了一半的记录在重新打开时被截掉。
+    """
+
+    FIELDS = ['comment_id', 'content', 'created_at', 'user_name', 'like_count', 'parent_id', 'sentiment']
+
+    def __init__(self, path, flush_every=50):
+        self.path = path
+        self.flush_every = max(1, int(flush_every))
+        self._unsynced = 0
+        self._file = None
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _repair(self):
+        """截掉末尾不完整的一行（崩溃时写了一半）"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            # 从末尾向前找到最后一个换行符
+            position = size - 1
+            while position > 0:
+                step = min(4096, position)
+                position -= step
+                f.seek(position)
+                chunk = f.read(step)
+                index = chunk.rfind(b'\n')
+                if index >= 0:
+                    f.truncate(position + index + 1)
+                    return
+            f.truncate(0)
+
+    def __iter__(self):
+        """逐行读取已记录的结果，跳过损坏的行"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def done_ids(self, exclude_sentiment=None):
+        """已记录的评论ID集合（字符串形式）
+
+        同一评论记录多次时以最后一条为准；最后一条的情感值等于exclude_sentiment的不算完成。
+        """
+        latest = {}
+        for record in self:
+            latest[str(record['comment_id'])] = record.get('sentiment')
+        return {
+            comment_id for comment_id, sentiment in latest.items()
+            if exclude_sentiment is None or sentiment != exclude_sentiment
+        }
+
+    def open(self):
+        """以追加方式打开日志，准备写入"""
+        if self._file is None:
+            self._repair()
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self
+
+    def append(self, result):
+        self._file.write(json.dumps(result, ensure_ascii=False, default=_to_builtin) + '\n')
+        self._unsynced += 1
+        if self._unsynced >= self.flush_every:
+            self.sync()
+
+    def sync(self):
+        """把缓冲区写入磁盘"""
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def export_csv(self, output_file):
+        """逐行把日志导出为CSV，不把全部结果读入内存
+
+        重复的评论只保留第一次出现的位置，情感值取最后一次记录（重试覆盖未分类）。
+
+        Returns:
+            导出的行数
+        """
+        self.sync()
+        latest = {}
+        for record in self:
+            latest[_record_key(record)] = record.get('sentiment')
+        
+        temp_file = output_file + '.tmp'
+        count = 0
+        with open(temp_file, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=self.FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for record in self:
+                comment_key = _record_key(record)
+                if comment_key not in latest:
+                    continue
+                record['sentiment'] = latest.pop(comment_key)
+                writer.writerow(record)
+                count += 1
+        os.replace(temp_file, output_file)
+        return count
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
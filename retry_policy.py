@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class APIError(Exception):
+    """API调用失败"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RetryableAPIError(APIError):
+    """可重试的错误：超时、连接失败、429、5xx、响应格式错误"""
+
+
+class FatalAPIError(APIError):
+    """不可重试的错误：请求非法、鉴权失败、余额不足等"""
+
+    @property
+    def stops_run(self):
+        """鉴权失败或余额不足时后续请求必然失败，应停止整个分析"""
+        return self.status_code in (401, 402, 403)
+
+
+def parse_retry_after(value):
+    """解析Retry-After头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动的重试策略"""
+
+    RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable_status(self, status_code):
+        return status_code in self.RETRYABLE_STATUS
+
+    def delay(self, attempt, retry_after=None):
+        """第attempt次（从0开始）失败后应等待的秒数，服务端给出Retry-After时以其为准"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后暂停所有工作线程一段时间
+
+    冷却结束后只放行一个探测请求（半开），探测成功才恢复，失败则再次熔断。
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.open_until = 0.0
+        self.probe_in_flight = False
+
+    def _open(self, seconds):
+        self.state = 'open'
+        self.open_until = max(self.open_until, time.monotonic() + seconds)
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            if self.state == 'half_open':
+                self._open(self.cooldown)
+                print(f"API探测请求失败，继续暂停 {self.cooldown:g} 秒")
+                return
+            self.failures += 1
+            if self.state == 'closed' and self.failures >= self.failure_threshold:
+                self._open(self.cooldown)
+                print(f"API连续失败 {self.failure_threshold} 次，暂停所有请求 {self.cooldown:g} 秒")
+
+    def pause(self, seconds):
+        """服务端要求限流（429 + Retry-After）时，让所有工作线程一起等待"""
+        with self.lock:
+            self._open(seconds)
+
+    def wait(self, should_continue=None):
+        """阻塞到允许发请求为止；should_continue返回False时放弃等待并返回False"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.state == 'closed':
+                    return True
+                if self.state == 'open' and now >= self.open_until:
+                    self.state = 'half_open'
+                if self.state == 'half_open' and not self.probe_in_flight:
+                    self.probe_in_flight = True
+                    return True
+                remaining = self.open_until - now if self.state == 'open' else 0.1
+            if should_continue is not None and not should_continue():
+                return False
+            time.sleep(min(max(remaining, 0.05), 0.5))
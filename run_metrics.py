@@ -0,0 +1,116 @@
+import json
+import math
+import threading
+import time
+
+
+# 延迟直方图的分桶上界（毫秒）
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+def percentile(values, q):
+    """最近秩法求百分位数，values须已排序"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
+
+
+def histogram(values):
+    """汇总一组数值：p50/p95/p99、均值、最大值以及分桶计数"""
+    ordered = sorted(values)
+    buckets = {}
+    for bound in LATENCY_BUCKETS_MS:
+        buckets[f'<{bound}'] = 0
+    buckets[f'>={LATENCY_BUCKETS_MS[-1]}'] = 0
+    for value in ordered:
+        for bound in LATENCY_BUCKETS_MS:
+            if value < bound:
+                buckets[f'<{bound}'] += 1
+                break
+        else:
+            buckets[f'>={LATENCY_BUCKETS_MS[-1]}'] += 1
+    return {
+        'count': len(ordered),
+        'p50': percentile(ordered, 50),
+        'p95': percentile(ordered, 95),
+        'p99': percentile(ordered, 99),
+        'mean': sum(ordered) / len(ordered) if ordered else 0.0,
+        'max': ordered[-1] if ordered else 0.0,
+        'buckets': buckets
+    }
+
+
+class RunMetrics:
+    """记录一次分析运行中每次API调用的耗时、重试与token用量"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = []
+            self.started_at = time.time()
+            self.comments_done = 0
+
+    def record_call(self, call):
+        """call为字典：wall_ms、queue_wait_ms、rate_wait_ms、breaker_wait_ms、retries、
+        status、prompt_tokens、completion_tokens、cached_tokens、comments"""
+        with self.lock:
+            self.calls.append(call)
+
+    def comment_done(self):
+        with self.lock:
+            self.comments_done += 1
+
+    def throughput(self):
+        """本次运行至今的处理速度（条/秒）"""
+        elapsed = time.time() - self.started_at
+        return self.comments_done / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        with self.lock:
+            calls = list(self.calls)
+            comments_done = self.comments_done
+        elapsed = time.time() - self.started_at
+
+        statuses = {}
+        retries = {}
+        for call in calls:
+            status = str(call.get('status'))
+            statuses[status] = statuses.get(status, 0) + 1
+            retry_count = str(call.get('retries', 0))
+            retries[retry_count] = retries.get(retry_count, 0) + 1
+
+        def total(field):
+            return sum(call.get(field) or 0 for call in calls)
+
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'comments_done': comments_done,
+            'comments_per_second': comments_done / elapsed if elapsed > 0 else 0.0,
+            'api_calls': len(calls),
+            'comments_sent': total('comments'),
+            'status_counts': statuses,
+            'retry_counts': retries,
+            'tokens': {
+                'prompt': total('prompt_tokens'),
+                'completion': total('completion_tokens'),
+                'cached': total('cached_tokens')
+            },
+            'wall_ms': histogram([call['wall_ms'] for call in calls]),
+            'queue_wait_ms': histogram([call.get('queue_wait_ms', 0.0) for call in calls]),
+            'rate_wait_ms': histogram([call.get('rate_wait_ms', 0.0) for call in calls]),
+            'breaker_wait_ms': histogram([call.get('breaker_wait_ms', 0.0) for call in calls]),
+            'sleep_ms_total': total('sleep_ms')
+        }
+
+    def write_report(self, path, extra=None):
+        """把汇总写成JSON运行报告"""
+        report = self.summary()
+        if extra:
+            report.update(extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return path
@@ -1,29 +1,94 @@
 import pandas as pd
 import requests
 import os
+import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from comment_dedup import CommentClusterer
+from comment_store import finalize, read_comments
 from config import ANALYZER_CONFIG, ERROR_MESSAGES
+from http_client import ConnectionStats, create_session
+from http_replay import attach_recorder
+from local_classifier import LocalClassifier
+from rate_limiter import RateLimiter
+from result_journal import ResultJournal
+from run_metrics import RunMetrics
+from retry_policy import (
+    APIError, CircuitBreaker, FatalAPIError, RetryableAPIError, RetryPolicy, parse_retry_after
+)
+from sentiment_cache import SentimentCache
+
+# API多次失败、无法给出判断的评论
+UNCLASSIFIED = -1
 
 class SentimentAnalyzer:
     def __init__(self):
         self.config = ANALYZER_CONFIG
         self.api_key = None
         self.progress_callback = None
+        self.throughput_callback = None  # 参数为(条/秒, 预计剩余秒数)
         self.is_running = True
         self.current_index = 0
         self.last_file = None
-        self.partial_results = []
+        self.dedup_stats = None
+        self.last_error = None
+        self.metrics = RunMetrics()
+        self._call_context = threading.local()  # 记录当前线程所处理批次的排队时间
         self.post_content = None  # 添加post_content属性初始化
+        self.rate_limiter = RateLimiter(
+            self.config.get('requests_per_second'),
+            self.config.get('tokens_per_minute')
+        )
+        self.retry_policy = RetryPolicy(
+            max_retries=self.config.get('max_retries', 3),
+            base_delay=self.config.get('retry_base_delay', 1.0),
+            max_delay=self.config.get('retry_max_delay', 60.0)
+        )
+        # 所有工作线程共用一个熔断器，API异常时一起暂停
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=self.config.get('breaker_failure_threshold', 5),
+            cooldown=self.config.get('breaker_cooldown', 30.0)
+        )
+        # 所有工作线程共用一个带连接池的Session，复用keep-alive连接
+        self.http_stats = ConnectionStats()
+        self.session = create_session(
+            self.config.get('pool_size') or self.config.get('max_workers', 1),
+            self.http_stats
+        )
+        if self.config.get('record_dir'):
+            attach_recorder(self.session, self.config['record_dir'])
+        self.cache = None
+        if self.config.get('cache_enabled'):
+            try:
+                self.cache = SentimentCache(
+                    self.config['cache_path'],
+                    self.config.get('cache_max_entries')
+                )
+            except Exception as e:
+                print(f"打开情感缓存失败，将不使用缓存: {str(e)}")
+        self.local_classifier = None
+        self.cascade_stats = None
+        if self.config.get('cascade_enabled'):
+            self.local_classifier = LocalClassifier(self.config.get('local_model_path'))
     
     def set_api_key(self, api_key):
         """设置API密钥"""
         self.api_key = api_key
         
-    def resume(self):
-        """继续分析"""
+    def resume(self, comments_file=None):
+        """继续分析
+
+        Args:
+            comments_file: 进程重启后没有上次的记录时，指定评论文件，从其结果日志继续
+        """
         self.is_running = True
+        if comments_file:
+            return self.analyze_comments(comments_file)
         if self.last_file and os.path.exists(self.last_file):
-            return self.analyze_comments(self.last_file, start_from=self.current_index)
+            # 从头对照结果日志：已完成的评论会被跳过，停止前失败的评论会重新分析
+            return self.analyze_comments(self.last_file)
         return None
         
     def stop(self):
@@ -32,107 +97,307 @@ class SentimentAnalyzer:
         
     def analyze_comments(self, comments_file, start_from=0):
         """分析评论"""
+        journal = None
         try:
             if not self.api_key:
                 raise ValueError(ERROR_MESSAGES['no_api_key'])
                 
             self.last_file = comments_file
             self.current_index = start_from
-            df = pd.read_csv(comments_file)
-            
-            # 如果是继续分析，使用之前保存的部分结果
-            if start_from > 0 and self.partial_results:
-                results = self.partial_results
-            else:
-                results = []
-            
+            self.last_error = None
+            df = read_comments(comments_file)
             total = len(df)
             
-            # 获取原文内容（如果存在）
+            # 结果逐条追加到日志，进程重启后跳过日志里已完成的评论（未分类的会重新分析）
+            journal = self._open_journal(comments_file)
+            done_ids = journal.done_ids(exclude_sentiment=UNCLASSIFIED)
+            if done_ids:
+                print(f"从分析日志恢复: 已完成 {len(done_ids)} 条评论")
+            comment_ids = df['comment_id'].astype(str).tolist()
+            indices = [idx for idx in range(start_from, total) if comment_ids[idx] not in done_ids]
+            
+            # 每次运行重新确定原文，不沿用上一条微博的；没有原文列时读取爬虫保存在评论文件旁的原文
             if 'original_post_content' in df.columns:
                 self.post_content = df['original_post_content'].iloc[0]
+            else:
+                self.post_content = self._load_post_content(comments_file)
+            if self.post_content:
                 print(f"找到原文内容: {self.post_content[:100]}...")
             
-            # 创建评论ID和内容的联合键到情感值的映射，确保相同评论有相同的情感值
-            comment_sentiment_map = {}
+            # 近似重复的评论（只差表情、@、链接、标点）归为一类，每类只分析一条代表
+            clusters = self._cluster_comments(df) if self.config.get('dedup_enabled') else None
             
-            # 从指定位置继续分析
-            for idx in range(start_from, len(df)):
-                if not self.is_running:
-                    self.current_index = idx
-                    self.partial_results = results
-                    if results:
-                        return self._save_partial_results(results)
-                    break
-                    
-                row = df.iloc[idx]
-                try:
-                    text_to_analyze = row['content']
-                    comment_id = row['comment_id']
-                    content = row['content']
-                    # 使用评论ID和内容的组合作为键，确保相同内容的评论得到相同的情感判断
-                    comment_key = f"{comment_id}_{content}"
-                    
-                    # 检查是否已经分析过这条评论
-                    if comment_key in comment_sentiment_map:
-                        sentiment = comment_sentiment_map[comment_key]
-                    else:
-                        sentiment = self._analyze_text(text_to_analyze)
-                        comment_sentiment_map[comment_key] = sentiment
-                    
-                    result = {
-                        'comment_id': comment_id,
-                        'content': content,
-                        'created_at': row['created_at'],
-                        'user_name': row['user_name'],
-                        'like_count': row['like_count'],
-                        'sentiment': sentiment
-                    }
-                    
-                    results.append(result)
-                    
-                    if self.progress_callback:
-                        progress = (idx + 1) / total * 100
-                        self.progress_callback(progress)
-                        
-                    time.sleep(0.5)  # 避免请求过快
-                    
-                except Exception as e:
-                    print(f"单条评论分析失败: {str(e)}")
-                    # 如果分析失败，使用中性情感
-                    sentiment = 1
-                    comment_sentiment_map[comment_key] = sentiment
-                    results.append({
-                        'comment_id': comment_id,
-                        'content': content,
-                        'created_at': row['created_at'],
-                        'user_name': row['user_name'],
-                        'like_count': row['like_count'],
-                        'sentiment': sentiment
-                    })
+            self._reset_run_stats()
             
-            # 保存完整结果
-            if results:
-                # 在保存之前去除重复的评论
-                unique_results = []
-                seen_comments = set()
-                for result in results:
-                    comment_key = f"{result['comment_id']}_{result['content']}"
-                    if comment_key not in seen_comments:
-                        seen_comments.add(comment_key)
-                        unique_results.append(result)
-                
-                self.partial_results = []  # 清空部分结果
-                return self._save_results(unique_results)
+            stopped, unclassified = self._run_pass(df, indices, clusters, journal, report_progress=True)
+            if not stopped:
+                stopped, unclassified = self._retry_unclassified(df, unclassified, clusters, journal)
+            return self._finish_run(journal, stopped, unclassified)
                 
         except Exception as e:
             print(f"分析失败: {str(e)}")
             return None
         finally:
+            if journal is not None:
+                journal.close()
             self.is_running = False  # 确保分析器停止
             
-    def _save_partial_results(self, results):
-        """保存部分分析结果"""
+    def analyze_stream(self, chunks):
+        """流水线模式：边爬边分析
+
+        Args:
+            chunks: 可迭代对象，每项为(评论文件路径, 评论行字典列表)，
+                    通常由 pipeline.CrawlAnalyzePipeline 从有界队列中取出；
+                    结果日志按第一项的评论文件命名，之后可以用 analyze_comments 从日志继续
+
+        Returns:
+            分析结果文件路径
+        """
+        journal = None
+        try:
+            if not self.api_key:
+                raise ValueError(ERROR_MESSAGES['no_api_key'])
+            
+            self.current_index = 0
+            self.last_error = None
+            self.dedup_stats = None
+            self._reset_run_stats()
+            stopped = False
+            failed = []
+            failed_clusters = []
+            
+            # 整个流共用一个聚类索引和一张代表->情感的映射，不同页上的近似重复评论也只分析一次
+            clusterer = self._new_clusterer() if self.config.get('dedup_enabled') else None
+            sentiment_map = {}
+            
+            for comments_file, rows in chunks:
+                if journal is None:
+                    self.last_file = comments_file
+                    journal = self._open_journal(comments_file)
+                df = pd.DataFrame(rows)
+                clusters = self._cluster_comments(df, clusterer) if clusterer else None
+                stopped, unclassified = self._run_pass(
+                    df, range(len(df)), clusters, journal, sentiment_map=sentiment_map
+                )
+                if unclassified:
+                    failed.append(df.iloc[unclassified])
+                    if clusters:
+                        failed_clusters.extend(clusters[idx] for idx in unclassified)
+                if stopped or not self.is_running:
+                    stopped = True
+                    break
+            
+            if journal is None:
+                return None
+            if self.dedup_stats:
+                self._print_dedup_stats()
+            
+            # 未分类的评论等全部分析完后一起重试，沿用流中的类别编号
+            unclassified = []
+            if failed and not stopped:
+                df = pd.concat(failed, ignore_index=True)
+                clusters = failed_clusters if len(failed_clusters) == len(df) else None
+                stopped, unclassified = self._retry_unclassified(df, list(range(len(df))), clusters, journal)
+            return self._finish_run(journal, stopped, unclassified)
+        
+        except Exception as e:
+            print(f"分析失败: {str(e)}")
+            return None
+        finally:
+            if journal is not None:
+                journal.close()
+            self.is_running = False
+    
+    @staticmethod
+    def _load_post_content(comments_file):
+        """读取爬虫保存在 comments_<mid>_<时间戳> 旁的 original_post_<mid>_<时间戳>.csv，没有时返回None"""
+        name = os.path.splitext(os.path.basename(comments_file))[0]
+        if not name.startswith('comments_'):
+            return None
+        post_file = os.path.join(
+            os.path.dirname(comments_file), f"original_post_{name[len('comments_'):]}.csv"
+        )
+        if not os.path.exists(post_file):
+            return None
+        try:
+            content = pd.read_csv(post_file, usecols=['content'], dtype=str)['content'].iloc[0]
+        except Exception as e:
+            print(f"读取原文失败: {str(e)}")
+            return None
+        return None if pd.isna(content) else content
+
+    def _reset_run_stats(self):
+        if self.cache:
+            self.cache.reset_stats()
+        self.http_stats.reset()
+        self.metrics.reset()
+        self.cascade_stats = {'local': 0, 'escalated': 0}
+    
+    def _retry_unclassified(self, df, unclassified, clusters, journal):
+        """API失败的评论标记为未分类，整轮结束后再重试，而不是当作中性"""
+        stopped = False
+        retry_round = 0
+        while not stopped and unclassified and retry_round < self.config.get('unclassified_retry_rounds', 0):
+            retry_round += 1
+            print(f"重新分析未分类的评论 {len(unclassified)} 条（第{retry_round}轮）")
+            stopped, unclassified = self._run_pass(df, unclassified, clusters, journal)
+        if unclassified and not stopped:
+            print(f"仍有 {len(unclassified)} 条评论未能分类，已标记为未分类")
+        return stopped, unclassified
+    
+    def _finish_run(self, journal, stopped, unclassified):
+        """输出本次运行的统计并导出结果"""
+        if self.cache:
+            self.cache.flush()
+            stats = self.cache.stats()
+            print(f"情感缓存命中 {stats['hits']} 条，未命中 {stats['misses']} 条，"
+                  f"共 {stats['size']} 条缓存")
+        
+        if self.http_stats.requests:
+            print(f"API连接: {self.http_stats.describe()}")
+        
+        if self.local_classifier:
+            judged = self.cascade_stats['local'] + self.cascade_stats['escalated']
+            rate = self.cascade_stats['escalated'] / judged if judged else 0.0
+            print(f"本地模型直接判断 {self.cascade_stats['local']} 条，"
+                  f"升级到API {self.cascade_stats['escalated']} 条（升级比例 {rate:.1%}）")
+        
+        journal.close()
+        
+        # 中途停止，保存部分结果以便继续
+        if stopped:
+            return self._save_partial_results(journal)
+        
+        # 保存完整结果（导出时去除重复的评论）；还有未分类的评论时保留日志，继续分析时重试
+        output_file = self._save_results(journal)
+        if output_file and not unclassified and not self._has_unclassified(output_file):
+            journal.remove()
+        return output_file
+
+    @staticmethod
+    def _has_unclassified(output_file):
+        """导出的结果中是否还有未分类的评论"""
+        try:
+            sentiments = read_comments(output_file, columns=['sentiment'])['sentiment']
+            return bool((sentiments == UNCLASSIFIED).any())
+        except Exception as e:
+            print(f"检查未分类评论失败，保留分析日志: {str(e)}")
+            return True
+            
+    def _run_pass(self, df, indices, clusters, journal, report_progress=False, sentiment_map=None):
+        """按输入顺序分析indices中的评论并写入日志
+
+        Args:
+            sentiment_map: 评论键到分析任务的映射，流水线模式中跨批次共用；None表示本轮新建
+
+        Returns:
+            (是否中途停止, 未能分类的评论下标列表)
+        """
+        total = len(df)
+        
+        # 创建评论ID和内容的联合键到分析任务的映射，确保相同评论有相同的情感值
+        comment_sentiment_map = {} if sentiment_map is None else sentiment_map
+        unclassified = []
+        
+        # 在途窗口：按输入顺序提交、按输入顺序收回，保证结果顺序不变
+        max_workers = max(1, int(self.config.get('max_workers', 1)))
+        batch_size = max(1, int(self.config.get('batch_size', 1)))
+        window = max_workers * batch_size * 2
+        pending = deque()
+        batch = []
+        position_in_pass = 0
+        last_report = 0
+        post_hash = self.cache.post_hash(self.post_content) if self.cache else None
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                while self.is_running and position_in_pass < len(indices) and len(pending) < window:
+                    idx = indices[position_in_pass]
+                    position_in_pass += 1
+                    row = df.iloc[idx]
+                    if clusters:
+                        # 同一类的评论共用代表的情感判断
+                        comment_key = f"cluster_{clusters[idx]}"
+                    else:
+                        # 使用评论ID和内容的组合作为键，确保相同内容的评论得到相同的情感判断
+                        comment_key = f"{row['comment_id']}_{row['content']}"
+                    # slot为[任务, 在批次中的位置, 待写入的缓存键]，提交批次时填入任务
+                    slot = comment_sentiment_map.get(comment_key)
+                    if slot is not None and self._slot_failed(slot):
+                        slot = None  # 之前的请求失败了，重新分析而不是沿用未分类
+                    if slot is None:
+                        cache_key = self._cache_key(row['content'])
+                        cached = self.cache.get(cache_key) if cache_key else None
+                        local = None if cached is not None else self._classify_locally(row['content'])
+                        if cached is not None:
+                            slot = [self._resolved([cached]), 0, None]
+                        elif local is not None:
+                            slot = [self._resolved([local]), 0, None]
+                        else:
+                            slot = [None, 0, cache_key]
+                            batch.append((row['content'], slot))
+                            if len(batch) >= batch_size:
+                                self._submit_batch(executor, batch)
+                        comment_sentiment_map[comment_key] = slot
+                    pending.append((idx, row, slot))
+                # 不满一批的评论只在输入用完、已停止或最早的评论还在等这一批时提交，
+                # 否则窗口满后每次补进来的一条都会单独请求
+                # 本轮只读一次is_running：工作线程随时可能调用stop()，两次读取之间停止会留下没有任务的slot
+                running = self.is_running
+                if position_in_pass >= len(indices) or not running or \
+                        (pending and pending[0][2][0] is None):
+                    self._submit_batch(executor, batch)
+                
+                if not pending:
+                    break
+                
+                if not running:
+                    # 已停止：取消尚未开始的请求，已经在途的结果照常收回
+                    for _, _, slot in pending:
+                        slot[0].cancel()
+                
+                idx, row, slot = pending[0]
+                future, position, cache_key = slot
+                if future.cancelled():
+                    break
+                pending.popleft()
+                
+                try:
+                    sentiment = future.result()[position]
+                except Exception as e:
+                    print(f"单条评论分析失败: {str(e)}")
+                    sentiment = UNCLASSIFIED
+                
+                if sentiment == UNCLASSIFIED:
+                    unclassified.append(idx)
+                elif cache_key:
+                    self.cache.put(cache_key, post_hash, sentiment, row['content'])
+                    slot[2] = None  # 重复评论只写一次
+                
+                journal.append(self._build_result(row, sentiment))
+                self.current_index = idx + 1
+                self.metrics.comment_done()
+                
+                if report_progress and self.progress_callback:
+                    try:
+                        self.progress_callback(self.current_index / total * 100)
+                    except Exception as e:
+                        print(f"进度回调失败: {str(e)}")
+                
+                if report_progress and self.throughput_callback and time.time() - last_report >= 1:
+                    last_report = time.time()
+                    rate = self.metrics.throughput()
+                    remaining = len(indices) - position_in_pass + len(pending)
+                    try:
+                        self.throughput_callback(rate, remaining / rate if rate > 0 else None)
+                    except Exception as e:
+                        print(f"速度回调失败: {str(e)}")
+        
+        stopped = bool(pending) or position_in_pass < len(indices)
+        return stopped, unclassified
+            
+    def _save_partial_results(self, journal):
+        """从日志导出部分分析结果"""
         try:
             if not os.path.exists(self.config['output_dir']):
                 os.makedirs(self.config['output_dir'])
@@ -142,24 +407,156 @@ class SentimentAnalyzer:
                 f'analyzed_partial_{int(time.time())}.csv'
             )
             
-            df_result = pd.DataFrame(results)
-            df_result.to_csv(output_file, index=False, encoding='utf-8-sig')
+            if not journal.export_csv(output_file):
+                os.remove(output_file)
+                return None
+            output_file = finalize(output_file)
+            self._write_run_report(output_file)
             return output_file
             
         except Exception as e:
             print(f"保存部分结果失败: {str(e)}")
             return None
             
-    def _analyze_text(self, text):
-        """调用DeepSeek R1 API进行情感分析"""
+    def _write_run_report(self, output_file):
+        """在分析结果旁写一份JSON运行报告：调用耗时分布、重试、token用量等"""
         try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
+            report_file = os.path.splitext(output_file)[0] + '_report.json'
+            self.metrics.write_report(report_file, {
+                'comments_file': self.last_file,
+                'output_file': output_file,
+                'settings': {
+                    key: self.config.get(key)
+                    for key in ('model', 'max_workers', 'batch_size', 'requests_per_second',
+                                'tokens_per_minute', 'cascade_enabled', 'dedup_enabled')
+                },
+                'http': self.http_stats.summary(),
+                'cache': self.cache.stats() if self.cache else None,
+                'dedup': self.dedup_stats,
+                'cascade': self.cascade_stats
+            })
+            print(f"运行报告已保存至: {report_file}")
+        except Exception as e:
+            print(f"保存运行报告失败: {str(e)}")
+
+    def _open_journal(self, comments_file):
+        """打开与评论文件对应的结果日志"""
+        name = os.path.splitext(os.path.basename(comments_file))[0]
+        journal = ResultJournal(
+            os.path.join(self.config['output_dir'], 'journal', f'{name}.jsonl'),
+            flush_every=self.config.get('journal_flush_every', 50)
+        )
+        return journal.open()
+
+    def _new_clusterer(self):
+        return CommentClusterer(threshold=self.config.get('dedup_threshold', 0.8))
+
+    def _cluster_comments(self, df, clusterer=None):
+        """对评论做近似重复聚类，返回与df行对应的类别编号列表
+
+        传入clusterer时在其已有的类别上继续聚类（流水线模式），统计累加到dedup_stats，不逐批输出
+        """
+        try:
+            texts = df['content'].astype(str).tolist()
+            if clusterer is None:
+                clusters = self._new_clusterer().cluster(texts)
+                comments = len(texts)
+                cluster_count = len(set(clusters))
+            else:
+                clusters = clusterer.extend(texts)
+                comments = (self.dedup_stats or {}).get('comments', 0) + len(texts)
+                cluster_count = clusterer.cluster_count
+            
+            self.dedup_stats = {
+                'comments': comments,
+                'clusters': cluster_count,
+                'api_calls_saved': comments - cluster_count
             }
+            if clusterer is None:
+                self._print_dedup_stats()
+            return clusters
             
-            # 构建带有原文上下文的提示
-            prompt = f'''作为一个微博内容发布者,请根据原文和评论的语境灵活判断每条评论的真实情感倾向。注意要结合当下的语境,特别是一些间接的表达方式(如反讽、阴阳怪气等)。
+        except Exception as e:
+            print(f"评论聚类失败，将逐条分析: {str(e)}")
+            return None
+
+    def _print_dedup_stats(self):
+        stats = self.dedup_stats
+        print(f"近似重复聚类: {stats['comments']} 条评论归为 {stats['clusters']} 类，"
+              f"节省 {stats['api_calls_saved']} 次分析")
+
+    @staticmethod
+    def _slot_failed(slot):
+        """slot的请求已经结束但没有得到情感值"""
+        future, position, _ = slot
+        if future is None or not future.done():
+            return False
+        if future.cancelled() or future.exception() is not None:
+            return True
+        return future.result()[position] == UNCLASSIFIED
+
+    def _classify_locally(self, text):
+        """级联第一级：本地模型有把握时直接返回情感值，否则返回None交给大模型"""
+        if not self.local_classifier:
+            return None
+        threshold = self.config.get('cascade_threshold', 0.9)
+        try:
+            sentiment, confidence = self.local_classifier.predict(text, threshold)
+        except Exception as e:
+            print(f"本地模型判断失败: {str(e)}")
+            sentiment, confidence = 1, 0.0
+        if confidence >= threshold:
+            self.cascade_stats['local'] += 1
+            return sentiment
+        self.cascade_stats['escalated'] += 1
+        return None
+
+    def _submit_batch(self, executor, batch):
+        """把攒好的一批评论提交给线程池，并回填各自的slot"""
+        if not batch:
+            return
+        future = executor.submit(self._run_batch, [text for text, _ in batch], time.perf_counter())
+        for position, (_, slot) in enumerate(batch):
+            slot[0] = future
+            slot[1] = position
+        batch.clear()
+
+    def _cache_key(self, text):
+        """计算评论的缓存键，未启用缓存时返回None"""
+        if not self.cache:
+            return None
+        return self.cache.make_key(
+            text, self.post_content, self.config['model'], self.config['prompt_version']
+        )
+
+    @staticmethod
+    def _resolved(labels):
+        """包装成已完成的任务，与线程池返回的任务统一处理"""
+        future = Future()
+        future.set_result(labels)
+        return future
+
+    def invalidate_cache(self, post_content=None):
+        """清除情感缓存，不传原文则全部清除，返回删除条数"""
+        if not self.cache:
+            return 0
+        return self.cache.invalidate(post_content)
+
+    def _build_result(self, row, sentiment):
+        """组装单条评论的分析结果"""
+        return {
+            'comment_id': row['comment_id'],
+            'content': row['content'],
+            'created_at': row['created_at'],
+            'user_name': row['user_name'],
+            'like_count': row['like_count'],
+            'parent_id': row['parent_id'] if 'parent_id' in row and pd.notna(row['parent_id']) else '',
+            'sentiment': sentiment
+        }
+
+    def _build_prompt(self, text):
+        """构建带有原文上下文的提示"""
+        return f'''作为一个微博内容发布者,请根据原文和评论的语境灵活判断每条评论的真实情感倾向。注意要结合当下的语境,特别是一些间接的表达方式(如反讽、阴阳怪气等)。
 
 不要被表面的词语迷惑,要理解评论背后真实的态度。
 
@@ -175,70 +572,228 @@ class SentimentAnalyzer:
 2: 消极态度
 
 (注:忽略[]内的表情、链接等内容)'''
-            
-            data = {
-                'model': 'deepseek-reasoner',  # 使用正确的R1模型名称
-                'messages': [{
-                    'role': 'user',
-                    'content': prompt
-                }],
-                'temperature': 0.1,  # 降低温度以获得更确定性的输出
-                'max_tokens': 10,    # 限制输出长度，因为我们只需要一个数字
-                'top_p': 0.1,        # 降低采样范围以获得更确定性的输出
-                'stream': False      # 关闭流式传输
-            }
-            
-            # 添加重试机制
-            max_retries = 3
-            retry_delay = 2  # 秒
-            
-            for attempt in range(max_retries):
+
+    def _build_batch_prompt(self, texts):
+        """构建一次判断多条评论的提示，评论按序号排列"""
+        numbered = '\n'.join(
+            f"{i}. {' '.join(str(text).split())}" for i, text in enumerate(texts, 1)
+        )
+        return f'''作为一个微博内容发布者,请根据原文和评论的语境灵活判断每条评论的真实情感倾向。注意要结合当下的语境,特别是一些间接的表达方式(如反讽、阴阳怪气等)。
+
+不要被表面的词语迷惑,要理解评论背后真实的态度。
+
+微博原文:
+{self.post_content}
+
+以下共{len(texts)}条评论,每条前面是序号:
+{numbered}
+
+请基于每条评论的真实态度给出对应数字:
+0: 积极态度
+1: 中性态度 
+2: 消极态度
+
+严格按"序号:数字"的格式每行输出一条,共{len(texts)}行,不要输出其他内容。
+
+(注:忽略[]内的表情、链接等内容)'''
+
+    def _parse_batch_labels(self, content, expected):
+        """解析批量结果，格式或条数不符时返回None"""
+        labels = {}
+        for line in content.strip().splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            match = re.fullmatch(r'(\d+)\s*[:：.、]\s*([012])', line)
+            if not match:
+                return None
+            number = int(match.group(1))
+            if number in labels or not 1 <= number <= expected:
+                return None
+            labels[number] = int(match.group(2))
+        if len(labels) != expected:
+            return None
+        return [labels[i] for i in range(1, expected + 1)]
+
+    def _run_batch(self, texts, submitted_at):
+        """线程池入口：记下批次在队列中等待的时间，再进行分析"""
+        self._call_context.queue_wait = time.perf_counter() - submitted_at
+        return self._analyze_batch(texts)
+
+    def _analyze_batch(self, texts):
+        """一次请求判断多条评论，返回与texts等长的情感列表
+
+        批量结果格式错误或条数不对时，退回逐条调用；
+        API本身失败时整批标记为未分类，留待重试。
+        """
+        if len(texts) == 1:
+            return [self._analyze_text(texts[0])]
+
+        try:
+            prompt = self._build_batch_prompt(texts)
+            # 每行形如"12:0"，按每条8个token预留输出
+            content = self._request_completion(prompt, max_tokens=len(texts) * 8, comments=len(texts))
+            labels = self._parse_batch_labels(content, len(texts))
+            if labels is not None:
+                return labels
+            print(f"批量结果格式不符，改为逐条分析: {content[:100]}")
+        except APIError as e:
+            self._handle_api_error(e)
+            return [UNCLASSIFIED] * len(texts)
+        except Exception as e:
+            print(f"批量分析出错，改为逐条分析: {str(e)}")
+
+        return [self._analyze_text(text) for text in texts]
+
+    def _analyze_text(self, text):
+        """调用DeepSeek R1 API进行情感分析，失败时返回UNCLASSIFIED"""
+        try:
+            content = self._request_completion(self._build_prompt(text), max_tokens=10)
+
+            # 更严格的输出验证
+            if content not in ['0', '1', '2']:
+                print(f"模型返回了意外的结果: {content}")
+                return UNCLASSIFIED
+
+            sentiment = int(content)
+            return sentiment
+
+        except APIError as e:
+            self._handle_api_error(e)
+            return UNCLASSIFIED
+        except Exception as e:
+            print(f"分析过程出错: {str(e)}")
+            return UNCLASSIFIED
+
+    def _handle_api_error(self, error):
+        """记录API错误；鉴权失败、余额不足等致命错误会停止整个分析"""
+        print(f"API调用失败: {str(error)}")
+        if isinstance(error, FatalAPIError) and error.stops_run:
+            self.last_error = str(error)
+            self.stop()
+
+    def _request_completion(self, prompt, max_tokens, comments=1):
+        """调用DeepSeek接口，返回模型输出文本
+
+        每次调用（含重试）的耗时、排队与限速等待、重试次数、状态码和token用量记入self.metrics。
+
+        Raises:
+            FatalAPIError: 不可重试的错误（请求非法、鉴权失败、余额不足等）
+            RetryableAPIError: 可重试的错误，但重试次数已用尽
+        """
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+
+        data = {
+            'model': self.config['model'],  # 默认使用R1模型deepseek-reasoner
+            'messages': [{
+                'role': 'user',
+                'content': prompt
+            }],
+            'temperature': 0.1,  # 降低温度以获得更确定性的输出
+            'max_tokens': max_tokens,  # 限制输出长度，我们只需要数字
+            'top_p': 0.1,        # 降低采样范围以获得更确定性的输出
+            'stream': False      # 关闭流式传输
+        }
+        
+        # 中文提示词按一字一token粗略估算，再加上输出上限
+        estimated_tokens = len(prompt) + max_tokens
+        policy = self.retry_policy
+        last_error = None
+        
+        # 排队时间只算在该批次的第一次调用上
+        queue_wait = getattr(self._call_context, 'queue_wait', 0.0)
+        self._call_context.queue_wait = 0.0
+        call = {
+            'comments': comments,
+            'queue_wait_ms': queue_wait * 1000,
+            'rate_wait_ms': 0.0,
+            'breaker_wait_ms': 0.0,
+            'sleep_ms': 0.0,
+            'retries': 0,
+            'status': None
+        }
+        call_start = time.perf_counter()
+
+        try:
+            for attempt in range(policy.max_retries + 1):
+                call['retries'] = attempt
+                
+                # 熔断期间所有工作线程在此等待
+                wait_start = time.perf_counter()
+                if not self.circuit_breaker.wait(lambda: self.is_running):
+                    raise RetryableAPIError("分析已停止")
+                call['breaker_wait_ms'] += (time.perf_counter() - wait_start) * 1000
+                
+                # 由限速器控制请求节奏，取代固定的sleep
+                call['rate_wait_ms'] += self.rate_limiter.acquire(estimated_tokens) * 1000
+                retry_after = None
                 try:
-                    response = requests.post(
-                        'https://api.deepseek.com/chat/completions',
+                    request_start = time.perf_counter()
+                    response = self.session.post(
+                        self.config['api_url'],
                         headers=headers,
                         json=data,
-                        timeout=30
+                        timeout=(self.config.get('connect_timeout', 5), self.config.get('read_timeout', 30))
                     )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        content = result['choices'][0]['message']['content'].strip()
-                        
-                        # 更严格的输出验证
-                        if content not in ['0', '1', '2']:
-                            print(f"模型返回了意外的结果: {content}")
-                            return 1
-                            
-                        sentiment = int(content)
-                        return sentiment
-                        
+                    self.http_stats.record_request(time.perf_counter() - request_start)
                 except requests.exceptions.Timeout:
-                    if attempt < max_retries - 1:
-                        print(f"API调用超时，正在进行第{attempt + 2}次尝试...")
-                        time.sleep(retry_delay)
-                        continue
-                    else:
-                        print("API调用多次超时，返回中性结果")
-                        return 1
-                        
-                except Exception as e:
-                    print(f"API调用失败: {str(e)}")
-                    if attempt < max_retries - 1:
-                        print(f"正在进行第{attempt + 2}次尝试...")
-                        time.sleep(retry_delay)
-                        continue
+                    call['status'] = 'timeout'
+                    last_error = RetryableAPIError("API调用超时")
+                except requests.exceptions.RequestException as e:
+                    call['status'] = 'network_error'
+                    last_error = RetryableAPIError(f"网络错误: {str(e)}")
+                else:
+                    status = response.status_code
+                    call['status'] = status
+                    if status == 200:
+                        try:
+                            result = response.json()
+                            content = result['choices'][0]['message']['content'].strip()
+                            self._record_usage(call, result.get('usage'))
+                            self.circuit_breaker.record_success()
+                            return content
+                        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                            last_error = RetryableAPIError(f"响应格式错误: {str(e)}", status)
+                    elif policy.is_retryable_status(status):
+                        last_error = RetryableAPIError(f"HTTP {status}", status)
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        if status == 429 and retry_after:
+                            # 服务端要求限流，所有工作线程一起等待
+                            self.circuit_breaker.pause(retry_after)
                     else:
-                        return 1
-            
-            return 1  # 如果所有重试都失败，返回中性结果
+                        # 服务端有响应，只是请求本身有问题，不算API异常
+                        self.circuit_breaker.record_success()
+                        raise FatalAPIError(f"HTTP {status}: {response.text[:200]}", status)
+                
+                self.circuit_breaker.record_failure()
+                if attempt < policy.max_retries:
+                    delay = policy.delay(attempt, retry_after)
+                    print(f"{last_error}，{delay:.1f} 秒后进行第{attempt + 2}次尝试...")
+                    time.sleep(delay)
+                    call['sleep_ms'] += delay * 1000
             
-        except Exception as e:
-            print(f"分析过程出错: {str(e)}")
-            return 1  # 出错时返回中性
+            raise last_error
+        finally:
+            call['wall_ms'] = (time.perf_counter() - call_start) * 1000
+            self.metrics.record_call(call)
+
+    @staticmethod
+    def _record_usage(call, usage):
+        """从响应的usage字段取出token用量（兼容DeepSeek与OpenAI两种缓存字段）"""
+        if not usage:
+            return
+        call['prompt_tokens'] = usage.get('prompt_tokens', 0)
+        call['completion_tokens'] = usage.get('completion_tokens', 0)
+        cached = usage.get('prompt_cache_hit_tokens')
+        if cached is None:
+            cached = (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+        call['cached_tokens'] = cached or 0
     
-    def _save_results(self, results):
-        """保存完整分析结果"""
+    def _save_results(self, journal):
+        """从日志导出完整分析结果"""
         try:
             if not os.path.exists(self.config['output_dir']):
                 os.makedirs(self.config['output_dir'])
@@ -248,8 +803,11 @@ class SentimentAnalyzer:
                 f'analyzed_{int(time.time())}.csv'
             )
             
-            df_result = pd.DataFrame(results)
-            df_result.to_csv(output_file, index=False, encoding='utf-8-sig')
+            if not journal.export_csv(output_file):
+                os.remove(output_file)
+                return None
+            output_file = finalize(output_file)
+            self._write_run_report(output_file)
             return output_file
             
         except Exception as e:
@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from config import ANALYZER_CONFIG
+
+
+class SentimentCache:
+    """按内容寻址的情感结果缓存（SQLite），跨运行共享
+
+    键为 规范化评论文本 + 微博原文 + 模型名 + 提示词版本 的哈希，
+    任一项变化都会自然失效；条目数超过上限时按最近使用时间淘汰。
+    """
+
+    def __init__(self, path, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._pending_writes = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS sentiment_cache (
+                key TEXT PRIMARY KEY,
+                post_hash TEXT NOT NULL,
+                sentiment INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                text TEXT
+            )
+        ''')
+        # 旧版缓存没有text列，补上以便用缓存的标签训练本地模型
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(sentiment_cache)')]
+        if 'text' not in columns:
+            self.conn.execute('ALTER TABLE sentiment_cache ADD COLUMN text TEXT')
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_cache_last_used ON sentiment_cache (last_used)'
+        )
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_cache_post_hash ON sentiment_cache (post_hash)'
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def normalize(text):
+        """规范化评论文本：去掉首尾空白并合并连续空白"""
+        return ' '.join(str(text).split())
+
+    @staticmethod
+    def _hash(*parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    def post_hash(self, post_content):
+        """微博原文的哈希，用于按微博失效缓存"""
+        return self._hash(self.normalize(post_content or ''))
+
+    def make_key(self, text, post_content, model, prompt_version):
+        """生成缓存键"""
+        return self._hash(
+            self.normalize(text), self.post_hash(post_content), model, prompt_version
+        )
+
+    def get(self, key):
+        """查询缓存，命中返回情感值，未命中返回None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT sentiment FROM sentiment_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute(
+                'UPDATE sentiment_cache SET last_used = ? WHERE key = ?', (time.time(), key)
+            )
+            self._mark_dirty()
+            return row[0]
+
+    def put(self, key, post_hash, sentiment, text=None):
+        """写入一条缓存，text为规范化前的评论文本（可选）"""
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO sentiment_cache (key, post_hash, sentiment, last_used, text) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, post_hash, int(sentiment), time.time(),
+                 self.normalize(text) if text is not None else None)
+            )
+            self._mark_dirty()
+
+    def labeled_texts(self):
+        """返回所有带文本的缓存条目，元素为(评论文本, 情感值)"""
+        with self.lock:
+            self._commit()
+            rows = self.conn.execute(
+                'SELECT text, sentiment FROM sentiment_cache WHERE text IS NOT NULL ORDER BY key'
+            ).fetchall()
+        return rows
+
+    def _mark_dirty(self):
+        """攒够一定写入量再提交，避免每条都落盘"""
+        self._pending_writes += 1
+        if self._pending_writes >= 200:
+            self._commit()
+
+    def _commit(self):
+        self.conn.commit()
+        self._pending_writes = 0
+        self._evict()
+
+    def _evict(self):
+        """超过容量上限时淘汰最久未使用的条目"""
+        if not self.max_entries:
+            return
+        count = self.conn.execute('SELECT COUNT(*) FROM sentiment_cache').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self.conn.execute(
+                'DELETE FROM sentiment_cache WHERE key IN ('
+                'SELECT key FROM sentiment_cache ORDER BY last_used LIMIT ?)',
+                (overflow,)
+            )
+            self.conn.commit()
+
+    def flush(self):
+        """提交尚未落盘的写入"""
+        with self.lock:
+            self._commit()
+
+    def invalidate(self, post_content=None):
+        """清除缓存：指定原文时只清除该微博的结果，否则全部清除
+
+        Returns:
+            被删除的条目数
+        """
+        with self.lock:
+            if post_content is None:
+                cursor = self.conn.execute('DELETE FROM sentiment_cache')
+            else:
+                cursor = self.conn.execute(
+                    'DELETE FROM sentiment_cache WHERE post_hash = ?',
+                    (self.post_hash(post_content),)
+                )
+            self.conn.commit()
+            self._pending_writes = 0
+            return cursor.rowcount
+
+    def stats(self):
+        """返回命中/未命中次数及当前条目数"""
+        with self.lock:
+            size = self.conn.execute('SELECT COUNT(*) FROM sentiment_cache').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': size
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='情感分析结果缓存管理')
+    parser.add_argument('--path', default=ANALYZER_CONFIG['cache_path'], help='缓存文件路径')
+    parser.add_argument('--invalidate', action='store_true', help='清除全部缓存')
+    parser.add_argument('--post-file', help='只清除该微博原文（文本文件）对应的缓存')
+    args = parser.parse_args()
+
+    cache = SentimentCache(args.path, ANALYZER_CONFIG.get('cache_max_entries'))
+    if args.post_file:
+        with open(args.post_file, encoding='utf-8') as f:
+            removed = cache.invalidate(f.read())
+        print(f"已清除 {removed} 条缓存")
+    elif args.invalidate:
+        removed = cache.invalidate()
+        print(f"已清除 {removed} 条缓存")
+    print(f"当前缓存条目数: {cache.stats()['size']}")
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+import jieba
+from comment_store import read_comments
+
+# 修改停用词或分词规则后递增，旧的分词缓存自动失效
+TOKENIZER_VERSION = 1
+
+URL_PATTERN = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+
+STOP_WORDS = frozenset(['了', '的', '是', '啊', '吗', '呢', '吧', '呀', '着', '啦', '么',
+                        '都', '就', '也', '要', '这', '那', '不', '还', '有', '和', '我',
+                        '你', '他', '她', '它', '们', '个', '年', '月', '日', 'http', 'https',
+                        'com', 'cn', 'www', 'html', 'org', 'net'])
+
+# 词频索引中每种情感保留的词数，远多于词云显示的max_words
+FREQUENCY_WORDS = 1000
+
+_caches = {}
+_caches_lock = threading.Lock()
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def content_key(text):
+    """评论内容的哈希，作为分词缓存的键"""
+    return hashlib.blake2b(str(text).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def tokenize(text):
+    """对一条评论分词：去掉URL，过滤停用词、单字和纯ASCII词"""
+    text = URL_PATTERN.sub('', str(text))
+    return [word for word in jieba.cut(text)
+            if len(word) > 1 and word not in STOP_WORDS and not word.isascii()]
+
+
+def cache_path(dataset_file):
+    """分词缓存保存在分析结果文件旁：<文件名>_tokens.json"""
+    return os.path.splitext(dataset_file)[0] + '_tokens.json'
+
+
+class TokenCache:
+    """每条评论过滤后的分词结果，按评论内容哈希缓存
+
+    同一份评论生成总体词云、各情感词云、关键词统计和搜索时只分词一次；
+    缓存文件带分词规则版本号，规则变化后整体重建。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tokens = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == TOKENIZER_VERSION:
+                self.tokens = data['tokens']
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"分词缓存无法读取，将重新分词: {str(e)}")
+
+    def get_many(self, contents):
+        """返回与contents一一对应的分词列表，没有缓存的评论现场分词"""
+        result = []
+        with self.lock:
+            for text in contents:
+                key = content_key(text)
+                tokens = self.tokens.get(key)
+                if tokens is None:
+                    tokens = self.tokens[key] = tokenize(text)
+                    self.misses += 1
+                    self._dirty = True
+                else:
+                    self.hits += 1
+                result.append(tokens)
+        return result
+
+    def save(self):
+        """有新的分词结果时写回文件（先写临时文件再替换）"""
+        with self.lock:
+            if not self._dirty:
+                return
+            temp_file = self.path + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': TOKENIZER_VERSION, 'tokens': self.tokens},
+                          f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temp_file, self.path)
+            self._dirty = False
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.tokens), 'hits': self.hits, 'misses': self.misses}
+
+
+def for_dataset(dataset_file):
+    """该分析结果对应的分词缓存，同一进程内共用一个实例"""
+    path = cache_path(dataset_file)
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = TokenCache(path)
+    return cache
+
+
+def frequency_path(dataset_file):
+    return os.path.splitext(dataset_file)[0] + '_freq.json'
+
+
+def build_frequency_index(dataset_file):
+    """一遍扫描评论，得到总体（键'all'）和各情感（键为情感值字符串）的词频，每种保留前FREQUENCY_WORDS个词"""
+    df = read_comments(dataset_file, columns=['content', 'sentiment'])
+    cache = for_dataset(dataset_file)
+    tokens = cache.get_many(df['content'].astype(str))
+    cache.save()
+
+    counters = {'all': Counter()}
+    sentiments = df['sentiment'] if 'sentiment' in df.columns else [None] * len(df)
+    for sentiment, words in zip(sentiments, tokens):
+        counters['all'].update(words)
+        if sentiment is not None and sentiment == sentiment:  # 跳过缺失值
+            counters.setdefault(str(int(sentiment)), Counter()).update(words)
+    return {key: dict(counter.most_common(FREQUENCY_WORDS)) for key, counter in counters.items()}
+
+
+def frequency_index(dataset_file):
+    """该分析结果的词频索引：先查内存，再查文件旁的 <文件名>_freq.json，分析结果变化后重建"""
+    stat = os.stat(dataset_file)
+    signature = [stat.st_mtime_ns, stat.st_size, TOKENIZER_VERSION, FREQUENCY_WORDS]
+    path = frequency_path(dataset_file)
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        index = None
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('signature') == signature:
+                index = data['frequencies']
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"词频索引无法读取，将重新统计: {str(e)}")
+
+        if index is None:
+            index = build_frequency_index(dataset_file)
+            temp_file = path + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'signature': signature, 'frequencies': index}, f, ensure_ascii=False)
+            os.replace(temp_file, path)
+        _indexes[path] = (signature, index)
+        return index
+
+
+def word_frequencies(dataset_file, sentiment=None):
+    """总体（sentiment为None）或某种情感的词频，按次数从多到少"""
+    index = frequency_index(dataset_file)
+    return index.get('all' if sentiment is None else str(sentiment), {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预先为分析结果分词并建立词频索引，或输出生成全部词云的耗时')
+    parser.add_argument('analyzed_file', help='分析结果文件（CSV或Parquet）')
+    parser.add_argument('--bench', action='store_true', help='依次生成总体与三种情感的词云，输出耗时')
+    args = parser.parse_args()
+
+    contents = read_comments(args.analyzed_file, columns=['content'])['content'].astype(str)
+
+    if not args.bench:
+        start = time.perf_counter()
+        cache = for_dataset(args.analyzed_file)
+        frequency_index(args.analyzed_file)
+        print(f"{len(contents)} 条评论，{cache.stats()}，耗时 {time.perf_counter() - start:.2f} 秒: {cache.path}")
+        return
+
+    from chart_maker import ChartMaker
+    chart_maker = ChartMaker()
+    start = time.perf_counter()
+    for text in contents:
+        tokenize(text)
+    print(f"全部评论分词一遍: {time.perf_counter() - start:.2f} 秒")
+    for sentiment in (None, 0, 1, 2):
+        start = time.perf_counter()
+        chart_maker.create_wordcloud(args.analyzed_file, sentiment)
+        print(f"词云 {sentiment if sentiment is not None else '总体'}: {time.perf_counter() - start:.2f} 秒")
+    print(f"分词缓存: {for_dataset(args.analyzed_file).stats()}，词频索引: {frequency_path(args.analyzed_file)}")
+
+
+if __name__ == '__main__':
+    main()
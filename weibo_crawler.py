@@ -1,38 +1,130 @@
-import requests
+import argparse
+import csv
+import glob
 import pandas as pd
 import time
 import os
 import re
 import json
+import logging
+import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
 from config import CRAWLER_CONFIG, ERROR_MESSAGES
+from http_client import ConnectionStats
+from comment_store import finalize
+from credential_pool import CredentialPool
+from retry_policy import FatalAPIError, RetryableAPIError, parse_retry_after
+
+try:
+    import orjson  # 可选，解析速度比标准库json快数倍
+except ImportError:
+    orjson = None
+
+# 评论文件的列，parent_id为空表示一级评论，否则为楼中楼回复所属的一级评论ID
+COMMENT_FIELDS = ['comment_id', 'content', 'created_at', 'user_name', 'like_count', 'parent_id']
+
+
+def loads(content):
+    """解析JSON响应体（bytes），安装了orjson时用orjson"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def comment_rows(comments, parent_id=''):
+    """从接口返回的评论列表中只取出要保存的字段"""
+    rows = []
+    append = rows.append
+    for comment in comments:
+        append({
+            'comment_id': comment['id'],
+            'content': comment['text_raw'],
+            'created_at': comment['created_at'],
+            'user_name': comment['user']['screen_name'],
+            'like_count': comment.get('like_counts', 0),
+            'parent_id': parent_id
+        })
+    return rows
+
+
+def _parse_created_at(value):
+    """解析微博的时间格式（如 Thu Oct 17 10:00:00 +0800 2026），失败时返回None"""
+    try:
+        return datetime.strptime(str(value), '%a %b %d %H:%M:%S %z %Y')
+    except ValueError:
+        return None
+
+
+class PostTask:
+    """单条微博的爬取状态，每条微博独立记录翻页位置，可以各自继续爬取"""
+
+    def __init__(self, url, incremental=False):
+        self.url = url
+        self.incremental = incremental
+        self.known_ids = set()  # 增量爬取时已保存的评论ID
+        self.newest_time = None  # 增量爬取时已保存评论中最新的发布时间
+        self.mid = None
+        self.uid = None
+        self.max_id = None
+        self.pages = 0
+        self.comment_count = 0  # 评论逐页写入文件，内存中只记条数
+        self.original_post = None
+        self.finished = False  # 已翻到最后一页
+        self.output_file = None  # 第一页到达时创建，继续爬取时接着追加
+        self.snapshot_file = None  # 存储格式为parquet时，爬完后另存的Parquet文件
+        self.fields = COMMENT_FIELDS  # 增量爬取时沿用已有文件的表头
+        self.error = None
+        self.lock = threading.Lock()  # 主翻页与回复线程并发写同一个文件
+        self.reply_threads = {}  # 一级评论ID -> 回复翻页位置，爬完的移除，停止后据此继续
+        self.reply_futures = []
+
+    @property
+    def done(self):
+        """一级评论翻到最后一页，且所有回复都已爬完"""
+        return self.finished and not self.reply_threads
+
 
 class WeiboCrawler:
     def __init__(self):
         self.config = CRAWLER_CONFIG
-        self.session = requests.Session()
-        self.headers = {}
+        # 所有爬取线程共用一个连接池
+        self.http_stats = ConnectionStats()
+        self.log_level = self._parse_log_level(self.config.get('log_level', 'INFO'))
+        # 每组凭据各自的会话、请求间隔与健康状态
+        self.credentials = CredentialPool(self.http_stats, self.config.get('max_workers', 1), self.config)
         self.progress_callback = None
+        self.post_progress_callback = None  # 参数为(微博URL, 该微博已爬取条数)
+        self.page_callback = None  # 参数为(PostTask, 该页评论行列表)，每页写入文件后调用，可阻塞以施加背压
         self.is_running = True
         self.current_page = 1
         self.max_id = None
-        self.comments = []
         self.url = None
         self.last_max_id = None  # 记录上次爬取的位置
         self.original_post = None  # 添加原文存储
-        
+        self.tasks = {}  # URL -> PostTask，最近一次爬取的各条微博
+        self._reply_executor = None
+
+    @staticmethod
+    def _parse_log_level(name):
+        """把配置中的日志级别（名称或数字）转为整数，无法识别时使用INFO"""
+        level = name if isinstance(name, int) else logging.getLevelName(str(name).upper())
+        if not isinstance(level, int):
+            print(f"无法识别的日志级别: {name}，改用INFO")
+            return logging.INFO
+        return level
+
     def set_headers(self, user_agent, cookie, referer):
-        """设置请求头"""
-        self.headers = {
-            'User-Agent': user_agent,
-            'Cookie': cookie,
-            'Referer': referer,
-            'X-Requested-With': 'XMLHttpRequest',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'zh-CN,zh;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive'
-        }
-        
+        """设置请求头（只使用这一组凭据）"""
+        self.credentials.clear()
+        self.credentials.add(user_agent, cookie, referer)
+
+    def add_credentials(self, user_agent, cookie, referer, name=None):
+        """再添加一组凭据，请求会分散到所有正常的凭据上"""
+        return self.credentials.add(user_agent, cookie, referer, name)
+
     def parse_cookies(self, cookie_string):
         """解析Cookie字符串"""
         cookies = {}
@@ -41,165 +133,579 @@ class WeiboCrawler:
                 key, value = item.strip().split('=', 1)
                 cookies[key] = value
         return cookies
-        
+
+    def _get(self, url, params=None):
+        """选一组凭据按其请求间隔发起GET请求，返回解析后的JSON
+
+        HTTP错误、非JSON响应都算失败：拉长该凭据的间隔后换一组凭据重试，
+        超过max_retries次仍失败时抛出RetryableAPIError；跳转登录的凭据标记为失效。
+        """
+        max_retries = self.config.get('max_retries', 3)
+        for attempt in range(max_retries + 1):
+            profile = self.credentials.acquire(url, lambda: self.is_running)
+            response = None
+            start = time.perf_counter()
+            try:
+                response = profile.session.get(
+                    url,
+                    headers=profile.headers,
+                    params=params,
+                    timeout=(self.config.get('connect_timeout', 5), self.config.get('read_timeout', 30))
+                )
+                data = self._check_response(response)
+                self.credentials.record_success(profile, url)
+                return data
+            except (requests.RequestException, RetryableAPIError, FatalAPIError) as e:
+                retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+                delay = self.credentials.record_failure(
+                    profile, url, e,
+                    status_code=getattr(e, 'status_code', None),
+                    retry_after=retry_after,
+                    expired=isinstance(e, FatalAPIError)
+                )
+                print(f"请求失败（第{attempt + 1}次，{profile.name}），{urlparse(url).netloc} "
+                      f"请求间隔调整为 {delay:.2f} 秒: {str(e)}")
+                if attempt == max_retries:
+                    if isinstance(e, RetryableAPIError):
+                        raise
+                    raise RetryableAPIError(str(e)) from e
+            finally:
+                self.http_stats.record_request(time.perf_counter() - start)
+
+    @staticmethod
+    def _check_response(response):
+        """检查响应是否正常，正常时返回JSON"""
+        if response.status_code >= 400:
+            raise RetryableAPIError(f"HTTP {response.status_code}", response.status_code)
+        if response.history and re.search(r'passport|login', response.url):
+            raise FatalAPIError("请求被重定向到登录页，Cookie可能已失效", response.status_code)
+        try:
+            data = loads(response.content)
+        except ValueError:
+            raise RetryableAPIError("响应不是JSON", response.status_code)
+        if isinstance(data, dict) and data.get('ok') == -100:
+            raise FatalAPIError("未登录或登录已失效", response.status_code)
+        return data
+
+    def current_delay(self, url):
+        """该主机当前的请求间隔（秒），多组凭据时取最短的"""
+        return self.credentials.current_delay(url)
+
+    @staticmethod
+    def _parse_post_url(url):
+        """从微博URL（或纯数字mid）中提取(mid, uid)，uid取不到时为空字符串"""
+        url = str(url).strip()
+        if url.isdigit():
+            return url, ''
+        if 'id=' in url:
+            mid = re.search(r'[?&]id=(\w+)', url).group(1)
+            uid_match = re.search(r'uid=(\d+)', url)
+            return mid, uid_match.group(1) if uid_match else ''
+        # 形如 https://weibo.com/<uid>/<mid>?...
+        match = re.search(r'weibo\.com/(\d+)/(\w+)', url)
+        if match:
+            return match.group(2), match.group(1)
+        mid_match = re.search(r'/(\d+)\?', url)
+        if not mid_match:
+            raise ValueError("无效的URL格式")
+        return mid_match.group(1), ''
+
     def _get_original_post(self, mid):
-        """获取微博原文"""
+        """获取微博原文，失败时返回None"""
         try:
-            url = f'https://weibo.com/ajax/statuses/show?id={mid}'
-            print(f"正在请求URL: {url}")
-            
-            response = self.session.get(url, headers=self.headers)
-            print(f"响应状态码: {response.status_code}")
-            
-            if response.status_code == 200:
-                data = response.json()
+            url = f"{self.config.get('base_url', 'https://weibo.com')}/ajax/statuses/show?id={mid}"
+            if self.log_level <= logging.DEBUG:
+                print(f"正在请求URL: {url}")
+
+            data = self._get(url)
+            if self.log_level <= logging.DEBUG:
                 print(f"响应数据: {json.dumps(data, ensure_ascii=False)[:200]}...")
-                
-                # 检查新的数据结构
-                if isinstance(data, dict):
-                    post_data = data
-                    self.original_post = {
-                        'post_id': post_data.get('id', ''),
-                        'content': post_data.get('text_raw', ''),
-                        'created_at': post_data.get('created_at', ''),
-                        'user_name': post_data.get('user', {}).get('screen_name', ''),
-                        'repost_count': post_data.get('reposts_count', 0),
-                        'comment_count': post_data.get('comments_count', 0),
-                        'like_count': post_data.get('attitudes_count', 0),
-                        'pics': [pic['url'] for pic in post_data.get('pics', [])] if 'pics' in post_data else []
-                    }
-                    print(f"处理后的微博信息: {json.dumps(self.original_post, ensure_ascii=False)}")
-                    return True
-            return False
-            
+
+            # 检查新的数据结构
+            if isinstance(data, dict):
+                post_data = data
+                original_post = {
+                    'post_id': post_data.get('id', ''),
+                    'content': post_data.get('text_raw', ''),
+                    'created_at': post_data.get('created_at', ''),
+                    'user_name': post_data.get('user', {}).get('screen_name', ''),
+                    'repost_count': post_data.get('reposts_count', 0),
+                    'comment_count': post_data.get('comments_count', 0),
+                    'like_count': post_data.get('attitudes_count', 0),
+                    'pics': [pic['url'] for pic in post_data.get('pics', [])] if 'pics' in post_data else []
+                }
+                if self.log_level <= logging.DEBUG:
+                    print(f"处理后的微博信息: {json.dumps(original_post, ensure_ascii=False)}")
+                return original_post
+            return None
+
         except Exception as e:
             print(f"获取原文失败: {str(e)}")
-            return False
-        
-    def crawl_comments(self, url):
-        """开始爬取评论"""
+            return None
+
+    def crawl_comments(self, url, incremental=False):
+        """开始爬取评论
+
+        Args:
+            incremental: 只抓取上次爬取之后的新评论，合并进该微博已有的评论文件
+        """
         self.url = url
         self.is_running = True
-        self.comments = []
         self.current_page = 1
-        self.max_id = None
-        self.original_post = None  # 重置原文
+        self.tasks = {url: PostTask(url, incremental)}
         return self._crawl()
-        
-    def _crawl(self, start_from_max_id=None):
-        """实际的爬取逻辑"""
+
+    def crawl_posts(self, urls, max_workers=None, incremental=False):
+        """并发爬取多条微博的评论，每条微博各自保存到一个文件
+
+        Args:
+            urls: 微博URL或mid列表
+            max_workers: 同时爬取的微博数，默认取配置中的max_workers
+            incremental: 只抓取上次爬取之后的新评论，合并进各微博已有的评论文件
+
+        Returns:
+            dict: URL -> 评论文件路径（没有爬到评论的为None）
+        """
+        self.url = None
+        self.is_running = True
+        self.tasks = {url: PostTask(url, incremental) for url in dict.fromkeys(urls)}
+        return self._run_tasks(list(self.tasks.values()), max_workers)
+
+    def _run_tasks(self, tasks, max_workers=None):
+        if not self.credentials.profiles or not all(
+                all(profile.headers.values()) for profile in self.credentials.profiles):
+            raise ValueError(ERROR_MESSAGES['no_headers'])
+        workers = max(1, min(len(tasks), max_workers or self.config.get('max_workers', 1)))
+        if self.config.get('crawl_replies'):
+            # 所有微博共用一个有界的回复线程池，与一级评论翻页同时进行
+            self._reply_executor = ThreadPoolExecutor(max_workers=self.config.get('reply_workers', 4))
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(self._crawl_task, tasks))
+        finally:
+            if self._reply_executor is not None:
+                self._reply_executor.shutdown(wait=True)
+                self._reply_executor = None
+        print(f"爬取结束，HTTP: {self.http_stats.describe()}")
+        print(self.credentials.describe())
+        return {task.url: self._result_file(task) for task in tasks}
+
+    def _crawl(self):
+        """爬取单条微博（crawl_comments / resume 使用）"""
+        task = self.tasks[self.url]
+        self._run_tasks([task])
+        # 兼容旧属性
+        self.max_id = task.max_id
+        self.original_post = task.original_post
+        return self._result_file(task)
+
+    def _crawl_task(self, task):
+        """爬取一条微博的评论直到最后一页或被停止，每页到达后立即追加写入文件"""
         try:
-            if not all(self.headers.values()):
-                raise ValueError(ERROR_MESSAGES['no_headers'])
+            if task.mid is None:
+                task.mid, task.uid = self._parse_post_url(task.url)
+                if task.incremental:
+                    self._load_existing(task)
+
+            if task.original_post is None:
+                task.original_post = self._get_original_post(task.mid)
+                if task.original_post is None:
+                    print(f"警告: 获取原文失败，将继续爬取评论 ({task.mid})")
+
+            task.error = None
+            # 上次停止时没爬完的回复接着爬
+            task.reply_futures = []
+            for comment_id in list(task.reply_threads):
+                self._submit_replies(task, comment_id)
+            while self.is_running and not task.finished:
+                self._fetch_page(task)
+        except Exception as e:
+            task.error = str(e)
+            print(f"爬取失败 ({task.url}): {str(e)}")
 
-            # 从URL中提取参数
+        # 等该微博的回复爬完
+        for future in task.reply_futures:
+            future.result()
+
+        # 全部爬完后按配置另存一份Parquet，CSV保留用于继续爬取和增量爬取
+        if task.done and task.output_file:
             try:
-                if 'id=' in self.url:
-                    mid = re.search(r'id=(\d+)', self.url).group(1)
-                    uid = re.search(r'uid=(\d+)', self.url).group(1)
-                else:
-                    mid_match = re.search(r'/(\d+)\?', self.url)
-                    if not mid_match:
-                        raise ValueError("无效的URL格式")
-                    mid = mid_match.group(1)
-                    uid = self.get_uid_from_url(self.url)
-                
-                # 获取原文
-                if not self._get_original_post(mid):
-                    print("警告: 获取原文失败，将继续爬取评论")
-                    
-                while self.is_running:
-                    # 构造API请求
-                    api_url = "https://weibo.com/ajax/statuses/buildComments"
-                    params = {
-                        'id': mid,
-                        'is_reload': 1,
-                        'is_show_bulletin': 2,
-                        'is_mix': 0,
-                        'count': 20,
-                        'uid': uid,
-                        'fetch_level': 0,
-                        'max_id': start_from_max_id if start_from_max_id else (self.max_id if self.max_id else 0)
-                    }
-                    
-                    response = self.session.get(api_url, headers=self.headers, params=params)
-                    data = response.json()
-                    
-                    if 'data' in data and isinstance(data['data'], list):
-                        comments_data = data['data']
-                        if not comments_data:
-                            break
-                            
-                        for comment in comments_data:
-                            self.comments.append({
-                                'comment_id': comment['id'],
-                                'content': comment['text_raw'],
-                                'created_at': comment['created_at'],
-                                'user_name': comment['user']['screen_name'],
-                                'like_count': comment.get('like_counts', 0)
-                            })
-                            
-                        # 回调进度
-                        if self.progress_callback:
-                            self.progress_callback(len(self.comments))
-                            
-                        # 获取下一页的max_id
-                        self.max_id = data.get('max_id')
-                        if not self.max_id:
-                            break
-                            
-                        self.current_page += 1
-                        time.sleep(self.config['sleep_time'])
-                    else:
-                        break
-                        
+                task.snapshot_file = finalize(task.output_file, keep_csv=True)
             except Exception as e:
-                print(f"爬取失败: {str(e)}")
-                
-            # 保存已爬取的评论
-            return self._save_comments()
-                
+                print(f"保存Parquet失败 ({task.url}): {str(e)}")
+        if task.done:
+            self._remove_checkpoint(task)
+        return task
+
+    @staticmethod
+    def _result_file(task):
+        return task.snapshot_file or task.output_file
+
+    def _fetch_page(self, task):
+        """请求下一页评论，写入文件后再更新翻页位置"""
+        api_url = f"{self.config.get('base_url', 'https://weibo.com')}/ajax/statuses/buildComments"
+        params = {
+            'id': task.mid,
+            'is_reload': 1,
+            'is_show_bulletin': 2,
+            'is_mix': 0,
+            'count': 20,
+            'uid': task.uid,
+            'fetch_level': 0,
+            'max_id': task.max_id if task.max_id else 0
+        }
+        if task.known_ids:
+            # 按时间倒序翻页，新评论都在前几页
+            params['flow'] = 1
+
+        data = self._get(api_url, params=params)
+        if 'data' not in data or not isinstance(data['data'], list) or not data['data']:
+            task.finished = True
+            return
+
+        rows = comment_rows(data['data'])
+        if task.known_ids:
+            if self._reached_known(task, rows):
+                task.finished = True
+            rows = [row for row in rows if str(row['comment_id']) not in task.known_ids]
+            task.known_ids.update(str(row['comment_id']) for row in rows)
+        new_ids = {str(row['comment_id']) for row in rows}
+        reply_ids = [
+            str(comment['id']) for comment in data['data']
+            if self._reply_executor is not None and comment.get('total_number') and str(comment['id']) in new_ids
+        ]
+
+        def advance():
+            for comment_id in reply_ids:
+                task.reply_threads[comment_id] = 0
+            task.pages += 1
+            if not task.finished:
+                # 获取下一页的max_id
+                task.max_id = data.get('max_id')
+                if not task.max_id:
+                    task.finished = True
+
+        self._append_comments(task, rows, advance)
+        for comment_id in reply_ids:
+            self._submit_replies(task, comment_id)
+
+        if self.log_level <= logging.INFO:
+            print(f"微博 {task.mid} 第 {task.pages} 页: 新增 {len(rows)} 条，"
+                  f"当前请求间隔 {self.current_delay(api_url):.2f} 秒")
+        self._report_progress(task)
+        if task.url == self.url and not task.finished:
+            self.current_page += 1
+
+    def _report_progress(self, task):
+        # 回调进度
+        if self.post_progress_callback:
+            self.post_progress_callback(task.url, task.comment_count)
+        if self.progress_callback:
+            self.progress_callback(sum(t.comment_count for t in self.tasks.values()))
+
+    def _submit_replies(self, task, comment_id):
+        if self._reply_executor is not None:
+            task.reply_futures.append(
+                self._reply_executor.submit(self._crawl_replies, task, comment_id)
+            )
+
+    def _crawl_replies(self, task, comment_id):
+        """翻页爬取一条一级评论下的全部回复，写入时带上parent_id"""
+        try:
+            while self.is_running and comment_id in task.reply_threads:
+                params = {
+                    'id': comment_id,
+                    'is_reload': 1,
+                    'is_show_bulletin': 2,
+                    'is_mix': 1,
+                    'count': 20,
+                    'uid': task.uid,
+                    'fetch_level': 1,
+                    'max_id': task.reply_threads[comment_id]
+                }
+                data = self._get(
+                    f"{self.config.get('base_url', 'https://weibo.com')}/ajax/statuses/buildComments",
+                    params=params
+                )
+                replies = data.get('data') if isinstance(data.get('data'), list) else []
+                rows = comment_rows(replies, parent_id=comment_id)
+                next_id = data.get('max_id')
+
+                def advance():
+                    if not rows or not next_id:
+                        task.reply_threads.pop(comment_id, None)
+                    else:
+                        task.reply_threads[comment_id] = next_id
+
+                self._append_comments(task, rows, advance)
+                if rows:
+                    self._report_progress(task)
         except Exception as e:
-            print(f"爬虫异常: {str(e)}")
-            raise
-            
-    def _save_comments(self):
-        """保存评论到文件"""
-        if self.comments:
+            # 保留在reply_threads中，继续爬取时重试
+            print(f"爬取回复失败 ({comment_id}): {str(e)}")
+
+    def _load_existing(self, task):
+        """增量爬取：读取该微博最近一次的评论文件，记下已有的评论ID和最新发布时间"""
+        pattern = os.path.join(self.config['output_dir'], f'comments_{task.mid}_*.csv')
+        files = sorted(glob.glob(pattern), key=os.path.getmtime)
+        if not files:
+            print(f"没有找到微博 {task.mid} 的历史评论，将完整爬取")
+            return
+        existing = pd.read_csv(files[-1], usecols=['comment_id', 'created_at'], dtype=str)
+        task.fields = list(pd.read_csv(files[-1], nrows=0).columns)
+        task.known_ids = set(existing['comment_id'])
+        times = [t for t in map(_parse_created_at, existing['created_at']) if t is not None]
+        task.newest_time = max(times) if times else None
+        # 新评论合并进已有文件
+        task.output_file = files[-1]
+        print(f"微博 {task.mid} 已有 {len(task.known_ids)} 条评论，只爬取新评论: {files[-1]}")
+
+    @staticmethod
+    def _reached_known(task, rows):
+        """整页都是已保存的评论（或都不晚于已保存的最新评论）时，说明已经翻到上次爬取的位置"""
+        if all(str(row['comment_id']) in task.known_ids for row in rows):
+            return True
+        if task.newest_time is None:
+            return False
+        times = [_parse_created_at(row['created_at']) for row in rows]
+        return all(t is not None and t < task.newest_time for t in times)
+
+    def _append_comments(self, task, rows, advance=None):
+        """把一页评论追加到该微博的评论文件，第一页到达时创建文件并写表头
+
+        advance在同一把锁内更新翻页位置，随后写检查点，检查点中的位置与文件内容始终一致。
+        """
+        with task.lock:
+            if rows:
+                self._write_rows(task, rows)
+            if advance:
+                advance()
+            self._save_checkpoint(task)
+        if rows and self.page_callback:
+            self.page_callback(task, rows)
+
+    def _write_rows(self, task, rows):
+        if task.output_file is None:
             if not os.path.exists(self.config['output_dir']):
                 os.makedirs(self.config['output_dir'])
-            
+
             timestamp = int(time.time())
-            
+            # 文件名带mid，增量爬取时据此找到该微博已有的评论
+            suffix = f'{task.mid}_{timestamp}'
+
             # 保存原文到单独的CSV文件
-            if self.original_post:
+            if task.original_post:
                 original_post_file = os.path.join(
                     self.config['output_dir'],
-                    f'original_post_{timestamp}.csv'
+                    f'original_post_{suffix}.csv'
                 )
-                original_post_df = pd.DataFrame([self.original_post])
+                original_post_df = pd.DataFrame([task.original_post])
                 original_post_df.to_csv(original_post_file, index=False, encoding='utf-8-sig')
                 print(f"原文已保存至: {original_post_file}")
-            
-            # 保存评论到CSV文件
+
             comments_file = os.path.join(
                 self.config['output_dir'],
-                f'comments_{timestamp}.csv'
+                f'comments_{suffix}.csv'
             )
-            
-            df = pd.DataFrame(self.comments)
-            df.to_csv(comments_file, index=False, encoding='utf-8-sig')
-            return comments_file
-        return None
-        
+            with open(comments_file, 'w', newline='', encoding='utf-8-sig') as f:
+                csv.DictWriter(f, fieldnames=task.fields).writeheader()
+            task.output_file = comments_file
+
+        # 追加模式下utf-8-sig不会重复写BOM
+        with open(task.output_file, 'a', newline='', encoding='utf-8-sig') as f:
+            csv.DictWriter(f, fieldnames=task.fields, extrasaction='ignore').writerows(rows)
+        task.comment_count += len(rows)
+
+    def _checkpoint_path(self, mid):
+        return os.path.join(self.config['checkpoint_dir'], f'{mid}.json')
+
+    def _save_checkpoint(self, task):
+        """把该微博的翻页位置写入检查点（调用方持有task.lock），先写临时文件再替换"""
+        if not self.config.get('checkpoint_dir') or task.mid is None:
+            return
+        os.makedirs(self.config['checkpoint_dir'], exist_ok=True)
+        state = {
+            'url': task.url,
+            'mid': task.mid,
+            'uid': task.uid,
+            'max_id': task.max_id,
+            'pages': task.pages,
+            'comment_count': task.comment_count,
+            'finished': task.finished,
+            'reply_threads': task.reply_threads,
+            'output_file': task.output_file,
+            # 检查点对应的文件长度，继续时截掉之后写入的行
+            'output_size': os.path.getsize(task.output_file) if task.output_file else 0,
+            'fields': task.fields,
+            'incremental': task.incremental,
+            'newest_time': task.newest_time.isoformat() if task.newest_time else None,
+            'original_post': task.original_post,
+            'updated_at': datetime.now().isoformat(timespec='seconds')
+        }
+        path = self._checkpoint_path(task.mid)
+        temp_file = path + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_file, path)
+
+    def _remove_checkpoint(self, task):
+        if not self.config.get('checkpoint_dir') or task.mid is None:
+            return
+        try:
+            os.remove(self._checkpoint_path(task.mid))
+        except FileNotFoundError:
+            pass
+
+    def list_checkpoints(self):
+        """读取检查点目录中所有没有爬完的微博的状态"""
+        states = []
+        if not self.config.get('checkpoint_dir'):
+            return states
+        for path in sorted(glob.glob(os.path.join(self.config['checkpoint_dir'], '*.json'))):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    states.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"跳过无法读取的检查点 {path}: {str(e)}")
+        return states
+
+    def _restore_task(self, state):
+        """按检查点重建PostTask"""
+        output_file = state.get('output_file')
+        if output_file and not os.path.exists(output_file):
+            print(f"检查点对应的评论文件不存在，将重新爬取: {output_file}")
+            return PostTask(state['url'], state.get('incremental', False))
+        if output_file and os.path.getsize(output_file) > state['output_size']:
+            # 上次进程写完一页后、更新检查点前退出：丢弃这些行，继续时重新请求，不会重复
+            with open(output_file, 'r+b') as f:
+                f.truncate(state['output_size'])
+
+        task = PostTask(state['url'], state.get('incremental', False))
+        task.mid = state['mid']
+        task.uid = state['uid']
+        task.max_id = state['max_id']
+        task.pages = state['pages']
+        task.comment_count = state['comment_count']
+        task.finished = state['finished']
+        task.reply_threads = dict(state.get('reply_threads') or {})
+        task.output_file = output_file
+        task.fields = state.get('fields') or COMMENT_FIELDS
+        task.original_post = state.get('original_post')
+        if state.get('newest_time'):
+            task.newest_time = datetime.fromisoformat(state['newest_time'])
+        if task.incremental and output_file:
+            task.known_ids = set(pd.read_csv(output_file, usecols=['comment_id'], dtype=str)['comment_id'])
+        return task
+
+    def resume_from_checkpoint(self, urls=None, max_workers=None):
+        """从检查点继续之前的进程（程序关闭或崩溃前）没有爬完的微博
+
+        Args:
+            urls: 只继续这些微博（URL或mid），None表示所有未爬完的检查点
+            max_workers: 同时爬取的微博数，默认取配置中的max_workers
+
+        Returns:
+            dict: URL -> 评论文件路径，没有可继续的检查点时为空字典
+        """
+        mids = {self._parse_post_url(url)[0] for url in urls} if urls else None
+        states = [state for state in self.list_checkpoints() if mids is None or state['mid'] in mids]
+        if not states:
+            print("没有可继续的检查点")
+            return {}
+
+        self.is_running = True
+        self.tasks = {}
+        for state in states:
+            task = self._restore_task(state)
+            self.tasks[task.url] = task
+            print(f"从检查点继续微博 {state['mid']}: 已爬取 {task.pages} 页、{task.comment_count} 条")
+        # 只有一条微博时，stop / resume 照常可用
+        self.url = next(iter(self.tasks)) if len(self.tasks) == 1 else None
+        return self._run_tasks(list(self.tasks.values()), max_workers)
+
     def stop(self):
         """停止爬取"""
         self.is_running = False
-        self.last_max_id = self.max_id  # 保存当前位置
-        
+        task = self.tasks.get(self.url)
+        if task:
+            self.last_max_id = task.max_id  # 保存当前位置
+
     def resume(self):
-        """继续爬取"""
-        if self.url and self.last_max_id:
+        """继续爬取，新评论追加到原来的文件"""
+        task = self.tasks.get(self.url)
+        if task and not task.done:
             self.is_running = True
-            return self._crawl(start_from_max_id=self.last_max_id)
-        return None
\ No newline at end of file
+            return self._crawl()
+        return None
+
+    def resume_posts(self):
+        """继续爬取上次crawl_posts中没有爬完的微博，已爬完的保持不变
+
+        Returns:
+            dict: URL -> 评论文件路径
+        """
+        pending = [task for task in self.tasks.values() if not task.done]
+        if not pending:
+            return {}
+        self.is_running = True
+        return self._run_tasks(pending)
+
+
+def benchmark_parse(recording, rounds=20):
+    """用录制的接口响应对比解析开销：标准库json + 调试输出 与 快速解析路径"""
+    pages = []
+    posts = []
+    with open(recording, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('status') != 200:
+                continue
+            if entry['path'].endswith('/buildComments'):
+                pages.append(entry['body'].encode('utf-8'))
+            elif entry['path'].endswith('/statuses/show'):
+                posts.append(entry['body'].encode('utf-8'))
+    if not pages:
+        print("录制文件中没有评论页")
+        return
+
+    def legacy():
+        for body in pages:
+            data = json.loads(body.decode('utf-8'))
+            [{
+                'comment_id': comment['id'],
+                'content': comment['text_raw'],
+                'created_at': comment['created_at'],
+                'user_name': comment['user']['screen_name'],
+                'like_count': comment.get('like_counts', 0)
+            } for comment in data['data']]
+        for body in posts:
+            data = json.loads(body.decode('utf-8'))
+            json.dumps(data, ensure_ascii=False)[:200]
+
+    def fast():
+        for body in pages:
+            comment_rows(loads(body)['data'])
+        for body in posts:
+            loads(body)
+
+    results = {}
+    for name, run in (('标准库json + 调试输出', legacy), ('快速解析路径', fast)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            run()
+        results[name] = (time.perf_counter() - start) / rounds / len(pages) * 1e6
+    print(f"评论页 {len(pages)} 个，原文 {len(posts)} 个，重复 {rounds} 轮，"
+          f"解码器: {'orjson' if orjson is not None else '标准库json'}")
+    for name, cost in results.items():
+        print(f"  {name}: {cost:.1f} 微秒/页")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='评论页解析开销基准测试')
+    parser.add_argument('recording', help='http_replay 录制的 exchanges.jsonl')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    benchmark_parse(args.recording, args.rounds)